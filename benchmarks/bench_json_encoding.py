@@ -0,0 +1,67 @@
+"""배치 JSON 인코딩 마이크로 벤치마크 (orjson vs 표준 json)
+
+users 테이블 형태의 합성 1000행 배치를 각 인코더로 반복 인코딩해 배치당 시간과
+payload 크기를 비교한다.
+
+    python benchmarks/bench_json_encoding.py [--rows 1000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sync_data  # noqa: E402
+
+
+def make_users_batch(rows, seed=42):
+    """RowSerializer를 거친 뒤와 같은 타입의 users 합성 행 생성"""
+    rng = random.Random(seed)
+    grades = ["일반", "실버", "골드", "VIP"]
+    base = datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "user_id": 100000 + i,
+            "nickname": f"사용자{rng.randint(1, 10 ** 6)}",
+            "phone": f"010{rng.randint(10 ** 7, 10 ** 8 - 1)}",
+            "signup_date": (base + timedelta(minutes=rng.randint(0, 3 * 10 ** 6))).isoformat(),
+            "grade_name": rng.choice(grades),
+            "mart_id": rng.randint(1, 500),
+            "mart_name": f"큐마켓 {rng.randint(1, 500)}호점",
+            "mart_is_enabled": True,
+            "agree_app_push": rng.random() < 0.6,
+            "agree_sms": rng.random() < 0.4,
+            "agree_alim_talk": rng.choice([True, False, None])
+        })
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    batch = make_users_batch(args.rows)
+    encoders = [("stdlib", sync_data._encode_json_stdlib)]
+    if sync_data.orjson is not None:
+        encoders.append(("orjson", sync_data._encode_json_orjson))
+    else:
+        print("⚠️ orjson이 설치되어 있지 않아 표준 json만 측정합니다.")
+
+    print(f"users 합성 배치: {args.rows}행, 반복 {args.repeat}회")
+    baseline = None
+    for name, encode in encoders:
+        payload = encode(batch)
+        seconds = min(timeit.repeat(lambda: encode(batch), number=args.repeat, repeat=3)) / args.repeat
+        baseline = baseline or seconds
+        print(f"{name:>7}: {seconds * 1000:8.3f} ms/배치, {len(payload):,} bytes, "
+              f"x{baseline / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""동기화 end-to-end 벤치마크 (로컬 PostgreSQL + PostgREST 스텁)
+
+규모(users 수)별로 합성 소스 데이터를 만들고 sync_data.run_all_syncs를 실행해
+테이블별 단계 시간/처리량과 전체 소요 시간을 출력한다. --runs 2면 소스 일부를 바꾼 뒤
+한 번 더 실행해 변경분 동기화(스냅샷 비교, 증분 추출, orphan 삭제)도 측정한다.
+
+    python benchmarks/bench_sync.py --scales 1000 10000 100000 --latency 0.02 --max-rows 1000
+
+PostgreSQL은 pg_fixture.local_postgres()를 따른다 (BENCH_PG_DSN 또는 임시 initdb 클러스터).
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import psycopg2  # noqa: E402
+
+import datagen  # noqa: E402
+from mock_postgrest import MockPostgREST  # noqa: E402
+from pg_fixture import local_postgres  # noqa: E402
+
+
+def _load_sync_data(pg_params, supabase_url, state_dir):
+    """벤치마크 DB/스텁 서버를 가리키도록 환경 변수를 설정한 뒤 sync_data import"""
+    os.environ.update({
+        "DB_HOST": pg_params["host"],
+        "DB_PORT": str(pg_params["port"]),
+        "DB_NAME": pg_params["dbname"],
+        "DB_USER": pg_params["user"],
+        "DB_PASSWORD": pg_params["password"] or "bench",
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": "bench",
+        "SYNC_STATE_DIR": state_dir,
+        "SYNC_REPORT_PATH": ""
+    })
+    os.environ.pop("FULL_RESYNC", None)
+    # 실제 Supabase DB에 합성 데이터를 직접 적재(direct/swap)하지 않도록 항상 REST(스텁 서버) 경로로
+    os.environ.pop("SUPABASE_DB_URL", None)
+    return importlib.import_module("sync_data")
+
+
+def _run_once(sync_data, args, log_file):
+    """run_all_syncs 한 번 실행 후 (전체 소요 시간, 테이블별 결과) 반환"""
+    sync_data.reset_metrics()
+    output = sys.stdout if args.verbose else log_file
+    with contextlib.redirect_stdout(output):
+        started = perf_counter()
+        overrides = {"loader": "rest"}
+        if args.engine:
+            overrides["upload_engine"] = args.engine
+        if args.concurrency:
+            overrides["upload_concurrency"] = args.concurrency
+        if args.prune_mode:
+            overrides["prune_mode"] = args.prune_mode
+        results = sync_data.run_all_syncs(workers=args.workers, tables=args.tables, overrides=overrides)
+        wall = perf_counter() - started
+    tables = {}
+    for table_name, ok in results.items():
+        tables[table_name] = dict(ok=ok, **sync_data.get_metrics(table_name).to_dict())
+    return wall, tables
+
+
+def _print_header():
+    print(f"{'scale':>8} {'run':>4} {'table':>8} {'ok':>3} {'rows':>9} {'total s':>8} "
+          f"{'extract':>8} {'upload':>8} {'prune':>7} {'rows/s':>9} {'upsert p50':>10}")
+
+
+def _print_row(scale, run, table_name, result):
+    phases = result["phase_seconds"]
+    counters = result["counters"]
+    rows = counters.get("rows_extracted", 0)
+    total = phases.get("total", 0.0)
+    p50 = result["latency_ms"].get("upsert", {}).get("p50")
+    print(f"{scale:>8,} {run:>4} {table_name:>8} {'✅' if result['ok'] else '❌':>2} {rows:>9,} "
+          f"{total:>8.2f} {phases.get('extract', 0):>8.2f} {phases.get('upload', 0):>8.2f} "
+          f"{phases.get('prune', 0):>7.2f} {rows / total if total else 0:>9,.0f} "
+          f"{'-' if p50 is None else f'{p50:.1f}ms':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="users 수 (규모별로 한 번씩 측정)")
+    parser.add_argument("--runs", type=int, choices=[1, 2], default=2,
+                        help="2면 첫 전체 동기화 뒤 소스를 바꿔 변경분 동기화를 한 번 더 측정")
+    parser.add_argument("--mutate-fraction", type=float, default=0.01)
+    parser.add_argument("--latency", type=float, default=0.01, help="스텁 서버 요청당 지연 (초)")
+    parser.add_argument("--row-latency", type=float, default=0.0, help="스텁 서버 쓰기 행당 지연 (초)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="스텁 서버 GET 최대 행 수")
+    parser.add_argument("--tables", nargs="+", help="측정할 테이블 (기본: 전체)")
+    parser.add_argument("--workers", type=int, help="동시에 동기화할 테이블 수")
+    parser.add_argument("--engine", choices=["thread", "async"], help="업로드/삭제 엔진")
+    parser.add_argument("--concurrency", type=int, help="테이블당 동시 요청 수")
+    parser.add_argument("--prune-mode", choices=["scan", "rpc"], help="orphan 삭제 방식")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    parser.add_argument("--verbose", action="store_true", help="동기화 로그를 그대로 출력")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sync_bench_")
+    state_dir = os.path.join(workdir, "state")
+    log_path = os.path.join(workdir, "sync.log")
+    report = []
+
+    with local_postgres() as pg_params, \
+            MockPostgREST(latency=args.latency, row_latency=args.row_latency,
+                          max_rows=args.max_rows) as mock, \
+            open(log_path, "w", encoding="utf-8") as log_file:
+        sync_data = _load_sync_data(pg_params, mock.url, state_dir)
+        print(f"🧪 스텁 {mock.url} (지연 {args.latency * 1000:.0f}ms, max-rows {args.max_rows}), "
+              f"동기화 로그: {log_path}")
+        _print_header()
+
+        for scale in args.scales:
+            conn = psycopg2.connect(**pg_params)
+            try:
+                started = perf_counter()
+                counts = datagen.populate(conn, scale, args.seed)
+                load_seconds = perf_counter() - started
+                mock.reset()
+                shutil.rmtree(state_dir, ignore_errors=True)
+
+                for run in range(1, args.runs + 1):
+                    if run > 1:
+                        datagen.mutate(conn, args.mutate_fraction, args.seed + run)
+                    wall, tables = _run_once(sync_data, args, log_file)
+                    for table_name, result in tables.items():
+                        _print_row(scale, run, table_name, result)
+                    print(f"{'':>8} {'':>4} {'(wall)':>8} {'':>3} {'':>9} {wall:>8.2f}")
+                    report.append({"scale": scale, "run": run, "source_rows": counts,
+                                   "source_load_seconds": round(load_seconds, 3),
+                                   "wall_seconds": round(wall, 3), "tables": tables,
+                                   "target_rows": mock.row_counts()})
+            finally:
+                conn.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📊 결과 저장: {args.output}")
+    shutil.rmtree(state_dir, ignore_errors=True)  # 로그 파일은 남겨 둠
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""동기화 쿼리가 읽는 소스 스키마의 합성 데이터 생성
+
+users 수(scale)를 기준으로 grades, marts, users, user_addresses, marketing_agreements,
+user_coupons, orders, payments 테이블을 만들고 COPY로 채운다. 분포는 운영 데이터의
+대략적인 비율(활성 회원 90%, 회원당 주문 3건 등)을 따르며 seed가 같으면 결과도 같다.
+
+    BENCH_PG_DSN=postgresql://... python benchmarks/datagen.py --users 10000
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from io import StringIO
+
+SCHEMA_SQL = """
+DROP TABLE IF EXISTS payments, orders, user_coupons, marketing_agreements,
+                     user_addresses, users, marts, grades CASCADE;
+
+CREATE TABLE grades (code text PRIMARY KEY, name text NOT NULL);
+CREATE TABLE marts (
+    mart_id integer PRIMARY KEY, name text NOT NULL,
+    enabled boolean NOT NULL, closed text
+);
+CREATE TABLE users (
+    user_id bigint PRIMARY KEY, nickname text, phone text,
+    created_date timestamp NOT NULL, grade text, user_status text NOT NULL
+);
+CREATE TABLE user_addresses (
+    user_address_id bigint PRIMARY KEY, user_id bigint NOT NULL, mart_id integer
+);
+CREATE TABLE marketing_agreements (
+    user_id bigint NOT NULL, marketing_type text NOT NULL, agreement boolean
+);
+CREATE TABLE user_coupons (
+    user_coupon_id bigint PRIMARY KEY, user_id bigint NOT NULL, coupon_id bigint NOT NULL,
+    is_used boolean NOT NULL, end_date date NOT NULL
+);
+CREATE TABLE orders (
+    order_id bigint PRIMARY KEY, user_id bigint NOT NULL,
+    created_date timestamp NOT NULL, state text NOT NULL
+);
+CREATE TABLE payments (
+    payment_id bigint PRIMARY KEY, order_id bigint NOT NULL, type text NOT NULL,
+    payment integer NOT NULL, state text NOT NULL
+);
+"""
+
+INDEX_SQL = """
+CREATE INDEX ON user_addresses (user_id, user_address_id DESC);
+CREATE INDEX ON marketing_agreements (user_id);
+CREATE INDEX ON user_coupons (user_id);
+CREATE INDEX ON orders (created_date);
+CREATE INDEX ON payments (order_id);
+ANALYZE;
+"""
+
+GRADES = [("NORMAL", "일반"), ("SILVER", "실버"), ("GOLD", "골드"), ("VIP", "VIP")]
+MARKETING_TYPES = ["APP_PUSH", "MESSAGE", "ALIM_TALK"]
+ORDER_STATES = ["PURCHASE_COMPLETED"] * 17 + ["CANCELED", "REFUNDED", "PENDING"]
+PAYMENT_TYPES = ["CARD"] * 5 + ["KAKAOPAY", "QMONEY", "COUPON", "DELIVERY_COUPON"]
+COPY_CHUNK_ROWS = 50000  # COPY 한 번에 보낼 행 수
+
+
+def _copy_value(value):
+    """COPY text 포맷 값"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value)
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """행 iterable을 COPY_CHUNK_ROWS 단위로 COPY FROM STDIN, 넣은 행 수 반환"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    count = 0
+    buffer = StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+        count += 1
+        if count % COPY_CHUNK_ROWS == 0:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer = StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    return count
+
+
+def _marts(rng, mart_count):
+    for mart_id in range(1, mart_count + 1):
+        closed = "연중휴무" if rng.random() < 0.03 else rng.choice(["일요일", "없음", None])
+        yield mart_id, f"큐마켓 {mart_id}호점", rng.random() < 0.95, closed
+
+
+def _users(rng, users, now):
+    for user_id in range(1, users + 1):
+        created = now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+        status = "ACTIVE" if rng.random() < 0.9 else rng.choice(["DORMANT", "WITHDRAWN"])
+        yield (user_id, f"사용자{rng.randint(1, 10 ** 6)}", f"010{rng.randint(10 ** 7, 10 ** 8 - 1)}",
+               created, rng.choice(GRADES)[0], status)
+
+
+def _user_addresses(rng, users, mart_count):
+    address_id = 0
+    for user_id in range(1, users + 1):
+        for _ in range(1 if rng.random() < 0.7 else rng.randint(2, 3)):
+            address_id += 1
+            yield address_id, user_id, rng.randint(1, mart_count)
+
+
+def _marketing_agreements(rng, users):
+    for user_id in range(1, users + 1):
+        for marketing_type in MARKETING_TYPES:
+            if rng.random() < 0.9:
+                yield user_id, marketing_type, rng.random() < 0.5
+
+
+def _user_coupons(rng, users, today):
+    coupon_id = 0
+    for user_id in range(1, users + 1):
+        for _ in range(rng.randint(0, 8)):
+            coupon_id += 1
+            end_date = today + timedelta(days=rng.randint(-60, 90))
+            yield coupon_id, user_id, rng.randint(1, 2000), rng.random() < 0.3, end_date
+
+
+def _orders_and_payments(rng, users, now):
+    """(orders 행 리스트, payments 행 리스트)를 회원 단위로 생성"""
+    order_id = 0
+    payment_id = 0
+    for user_id in range(1, users + 1):
+        orders, payments = [], []
+        for _ in range(rng.randint(0, 6)):
+            order_id += 1
+            created = now - timedelta(minutes=rng.randint(0, 400 * 24 * 60))
+            orders.append((order_id, user_id, created, rng.choice(ORDER_STATES)))
+            for _ in range(1 if rng.random() < 0.5 else rng.randint(2, 3)):
+                payment_id += 1
+                state = "COMPLETE" if rng.random() < 0.95 else "CANCELED"
+                payments.append((payment_id, order_id, rng.choice(PAYMENT_TYPES),
+                                 rng.randint(1, 500) * 100, state))
+        yield orders, payments
+
+
+def populate(conn, users, seed=42):
+    """스키마를 새로 만들고 users명 규모의 데이터를 채운 뒤 테이블별 행 수 반환"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    mart_count = max(10, users // 200)
+    counts = {}
+
+    with conn.cursor() as cursor:
+        cursor.execute(SCHEMA_SQL)
+        counts["grades"] = _copy_rows(cursor, "grades", ["code", "name"], GRADES)
+        counts["marts"] = _copy_rows(cursor, "marts", ["mart_id", "name", "enabled", "closed"],
+                                     _marts(rng, mart_count))
+        counts["users"] = _copy_rows(
+            cursor, "users",
+            ["user_id", "nickname", "phone", "created_date", "grade", "user_status"],
+            _users(rng, users, now))
+        counts["user_addresses"] = _copy_rows(
+            cursor, "user_addresses", ["user_address_id", "user_id", "mart_id"],
+            _user_addresses(rng, users, mart_count))
+        counts["marketing_agreements"] = _copy_rows(
+            cursor, "marketing_agreements", ["user_id", "marketing_type", "agreement"],
+            _marketing_agreements(rng, users))
+        counts["user_coupons"] = _copy_rows(
+            cursor, "user_coupons", ["user_coupon_id", "user_id", "coupon_id", "is_used", "end_date"],
+            _user_coupons(rng, users, now.date()))
+
+        # orders와 payments는 같은 생성기에서 나오므로 한 번 만든 뒤 나눠서 COPY
+        order_rows, payment_rows = [], []
+        for orders, payments in _orders_and_payments(rng, users, now):
+            order_rows.extend(orders)
+            payment_rows.extend(payments)
+        counts["orders"] = _copy_rows(cursor, "orders", ["order_id", "user_id", "created_date", "state"],
+                                      order_rows)
+        counts["payments"] = _copy_rows(cursor, "payments",
+                                        ["payment_id", "order_id", "type", "payment", "state"],
+                                        payment_rows)
+        cursor.execute(INDEX_SQL)
+    conn.commit()
+    return counts
+
+
+def mutate(conn, fraction=0.01, seed=42):
+    """두 번째 실행(변경분 동기화) 측정용으로 소스 데이터 일부를 바꿈
+
+    fraction 비율의 회원 닉네임 변경, 그 절반의 회원 탈퇴 처리(orphan),
+    쿠폰 사용 처리, 오늘자 주문/결제 추가를 한 트랜잭션에서 수행한다.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT setseed(%s)", (random.Random(seed).random(),))
+        cursor.execute("UPDATE users SET nickname = nickname || '*' WHERE random() < %s", (fraction,))
+        cursor.execute("UPDATE users SET user_status = 'WITHDRAWN' "
+                       "WHERE user_status = 'ACTIVE' AND random() < %s", (fraction / 2,))
+        cursor.execute("UPDATE user_coupons SET is_used = true WHERE NOT is_used AND random() < %s",
+                       (fraction,))
+        cursor.execute("""
+            WITH new_orders AS (
+                INSERT INTO orders (order_id, user_id, created_date, state)
+                SELECT (SELECT max(order_id) FROM orders) + row_number() OVER (),
+                       user_id, now(), 'PURCHASE_COMPLETED'
+                FROM users WHERE random() < %s
+                RETURNING order_id
+            )
+            INSERT INTO payments (payment_id, order_id, type, payment, state)
+            SELECT (SELECT max(payment_id) FROM payments) + row_number() OVER (),
+                   order_id, 'CARD', 10000, 'COMPLETE'
+            FROM new_orders
+        """, (fraction,))
+        cursor.execute("ANALYZE")
+    conn.commit()
+
+
+def main():
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    dsn = os.environ.get("BENCH_PG_DSN")
+    if not dsn:
+        raise SystemExit("❌ 데이터를 채울 DB의 BENCH_PG_DSN 환경 변수를 설정해야 합니다.")
+    conn = psycopg2.connect(dsn)
+    try:
+        counts = populate(conn, args.users, args.seed)
+    finally:
+        conn.close()
+    for table, count in counts.items():
+        print(f"{table:>22}: {count:,}")
+
+
+if __name__ == "__main__":
+    main()
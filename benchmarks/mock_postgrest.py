@@ -0,0 +1,438 @@
+"""벤치마크용 PostgREST 스텁 서버
+
+sync_data.py가 보내는 요청만 메모리 안에서 흉내 낸다.
+- POST /rest/v1/<table>?on_conflict=a,b : JSON 배열 upsert (Content-Encoding: gzip 지원)
+- GET /rest/v1/<table>?select=..&order=..&limit=.. + keyset 필터 : 키 스캔
+- DELETE /rest/v1/<table>?col=in.(..) 또는 or=(and(..),..) : orphan 삭제
+- POST /rest/v1/sync_prune_keys + /rest/v1/rpc/sync_prune_orphans : 서버 사이드 orphan 삭제
+
+요청마다 latency초, 쓰기 행마다 row_latency초를 지연시키고, max_rows가 있으면
+GET 응답 행 수를 그 값으로 자른다 (PostgREST db-max-rows와 같음).
+max_url_bytes가 있으면 요청 경로(쿼리 문자열 포함)가 그보다 긴 요청에 414를, max_body_bytes가
+있으면 본문(압축된 경우 압축된 크기)이 그보다 큰 POST에 413을 돌려준다 (게이트웨이 제한).
+
+    python benchmarks/mock_postgrest.py --port 54321 --latency 0.02 --max-rows 1000
+"""
+import argparse
+import gzip
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+TABLE_PREFIX = "/rest/v1/"
+
+
+# --- 필터 파싱 ---
+def _split_top_level(text):
+    """괄호/큰따옴표 밖의 쉼표로 분리"""
+    parts, depth, quoted, start = [], 0, False, 0
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quoted:
+            if c == "\\":
+                i += 1
+            elif c == '"':
+                quoted = False
+        elif c == '"':
+            quoted = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def _parse_condition(column, expression):
+    """op.value 형태 조건을 ("leaf", column, op, value) 노드로 변환"""
+    op, _, value = expression.partition(".")
+    if op == "in":
+        values = [_unquote(v) for v in _split_top_level(value[1:-1])] if value != "()" else []
+        return ("leaf", column, op, values)
+    return ("leaf", column, op, _unquote(value))
+
+
+def _parse_logic(kind, body):
+    """and(...)/or(...) 안쪽을 노드 트리로 변환"""
+    children = []
+    for item in _split_top_level(body[1:-1]):
+        if item.startswith(("and(", "or(")):
+            name, _, rest = item.partition("(")
+            children.append(_parse_logic(name, "(" + rest))
+        else:
+            column, _, expression = item.partition(".")
+            children.append(_parse_condition(column, expression))
+    return (kind, children)
+
+
+def parse_filters(params):
+    """쿼리 파라미터에서 행 필터 노드 트리(and) 생성"""
+    children = []
+    for key, value in params:
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        if key in ("and", "or"):
+            children.append(_parse_logic(key, value))
+        else:
+            children.append(_parse_condition(key, value))
+    return ("and", children)
+
+
+def _filter_columns(node):
+    if node[0] == "leaf":
+        return {node[1]}
+    return set().union(*(_filter_columns(child) for child in node[1])) if node[1] else set()
+
+
+def _coerce(sample, text):
+    """필터 문자열을 행 값과 같은 타입으로 변환"""
+    if isinstance(sample, bool):
+        return text == "true"
+    if isinstance(sample, int):
+        return int(text)
+    if isinstance(sample, float):
+        return float(text)
+    return text
+
+
+def matches(node, row):
+    kind = node[0]
+    if kind == "and":
+        return all(matches(child, row) for child in node[1])
+    if kind == "or":
+        return any(matches(child, row) for child in node[1])
+    _, column, op, value = node
+    actual = row.get(column)
+    if actual is None:
+        return op == "is" and value == "null"
+    if op == "in":
+        return actual in {_coerce(actual, v) for v in value}
+    expected = _coerce(actual, value)
+    return {
+        "eq": actual == expected, "neq": actual != expected,
+        "gt": actual > expected, "gte": actual >= expected,
+        "lt": actual < expected, "lte": actual <= expected
+    }.get(op, False)
+
+
+def _disjuncts(node):
+    """eq/in으로만 된 필터를 [{컬럼: 값 집합}, ...] (OR of AND) 형태로 전개, 불가능하면 None"""
+    kind = node[0]
+    if kind == "leaf":
+        _, column, op, value = node
+        if op == "eq":
+            return [{column: {value}}]
+        if op == "in":
+            return [{column: set(value)}]
+        return None
+    branches = [_disjuncts(child) for child in node[1]]
+    if any(branch is None for branch in branches):
+        return None
+    if kind == "or":
+        return [conj for branch in branches for conj in branch]
+    result = [{}]
+    for branch in branches:
+        merged = []
+        for left, right in itertools.product(result, branch):
+            conj = dict(left)
+            for column, values in right.items():
+                conj[column] = conj[column] & values if column in conj else values
+            merged.append(conj)
+        result = merged
+    return result
+
+
+# --- 테이블 저장소 ---
+class MockTable:
+    """키(on_conflict 컬럼) → 행 dict 저장소와 정렬 캐시
+
+    key_columns가 없으면(on_conflict 없는 INSERT) 행마다 일련번호를 키로 쓴다.
+    """
+
+    def __init__(self, key_columns):
+        self.key_columns = key_columns
+        self.rows = {}
+        self._sorted = {}  # order 컬럼 튜플 → [(정렬 키, 저장 키)], 행 추가 시 무효화
+        self._serial = itertools.count()
+
+    def key_of(self, row):
+        if not self.key_columns:
+            return (next(self._serial),)
+        return tuple(str(row[col]) for col in self.key_columns)
+
+    def upsert(self, rows):
+        for row in rows:
+            key = self.key_of(row)
+            existing = self.rows.get(key)
+            self.rows[key] = dict(existing, **row) if existing else row
+        self._sorted.clear()
+
+    def sorted_index(self, order_columns):
+        """order 컬럼 기준 정렬 목록 (삭제된 행은 남아 있을 수 있으므로 조회 시 확인)"""
+        index = self._sorted.get(order_columns)
+        if index is None:
+            index = sorted((tuple(row[col] for col in order_columns), key) for key, row in self.rows.items())
+            self._sorted[order_columns] = index
+        return index
+
+    def select(self, filters, order_columns, limit):
+        """필터를 만족하는 행을 order 순으로 최대 limit개 반환
+
+        필터가 order 컬럼만 쓰면 keyset 조건(단조 증가)으로 보고 이진 탐색으로 시작 위치를 찾는다.
+        """
+        index = self.sorted_index(order_columns)
+        start = 0
+        if _filter_columns(filters) <= set(order_columns):
+            lo, hi = 0, len(index)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if matches(filters, dict(zip(order_columns, index[mid][0]))):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            start = lo
+        result = []
+        for _, key in itertools.islice(index, start, None):
+            row = self.rows.get(key)
+            if row is not None and matches(filters, row):
+                result.append(row)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def delete(self, filters):
+        """필터에 맞는 행 삭제 후 삭제 수 반환 (키 eq/in 필터면 키로 바로 찾음)"""
+        conjuncts = _disjuncts(filters) if self.key_columns else None
+        if conjuncts is not None and all(set(self.key_columns) <= set(c) for c in conjuncts):
+            candidates = {key for conj in conjuncts
+                          for key in itertools.product(*(sorted(conj[col]) for col in self.key_columns))}
+        else:
+            candidates = [key for key, row in self.rows.items() if matches(filters, row)]
+        deleted = 0
+        for key in candidates:
+            if self.rows.pop(key, None) is not None:
+                deleted += 1
+        return deleted
+
+
+class MockPostgREST:
+    """ThreadingHTTPServer 기반 스텁 서버 (with 문으로 시작/종료)"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, row_latency=0.0, max_rows=None,
+                 max_url_bytes=None, max_body_bytes=None):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.max_rows = max_rows
+        self.max_url_bytes = max_url_bytes
+        self.max_body_bytes = max_body_bytes
+        self.tables = {}
+        self.requests = {}
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.tables.clear()
+            self.requests.clear()
+
+    def row_counts(self):
+        with self.lock:
+            return {name: len(table.rows) for name, table in self.tables.items()}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_request(self, method):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def prune_orphans(self, p_run_id, p_table, p_key_columns, p_expected_count):
+        """sync_prune_orphans 흉내: 스테이징되지 않은 키의 행을 삭제하고 삭제 수 반환"""
+        with self.lock:
+            staging = self.tables.get("sync_prune_keys")
+            staged = [row for row in staging.rows.values()
+                      if row["run_id"] == p_run_id and row["table_name"] == p_table] if staging else []
+            if len(staged) != p_expected_count:
+                raise ValueError(f"{len(staged)} keys staged for {p_table}, expected {p_expected_count}")
+            keep = {tuple(row["key"]) for row in staged}
+            table = self.tables.get(p_table)
+            deleted = 0
+            if table:
+                for key, row in list(table.rows.items()):
+                    if tuple(str(row[col]) for col in p_key_columns) not in keep:
+                        del table.rows[key]
+                        deleted += 1
+            if staging:
+                for key in [key for key, row in staging.rows.items() if row["run_id"] == p_run_id]:
+                    del staging.rows[key]
+            return deleted
+
+
+def _make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive (클라이언트 커넥션 풀 재사용)
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload=None):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _url_too_long(self):
+            if mock.max_url_bytes and len(self.path) > mock.max_url_bytes:
+                self._reply(414, {"message": "URI Too Long"})
+                return True
+            return False
+
+        def _parse(self):
+            parts = urlsplit(self.path)
+            if not parts.path.startswith(TABLE_PREFIX):
+                return None, None
+            return parts.path[len(TABLE_PREFIX):], parse_qsl(parts.query, keep_blank_values=True)
+
+        def _read_body(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if mock.max_body_bytes and len(body) > mock.max_body_bytes:
+                return None
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            return body
+
+        def do_POST(self):
+            mock.count_request("POST")
+            table_name, params = self._parse()
+            if table_name is None:
+                return self._reply(404, {"message": "not found"})
+            body = self._read_body()
+            if body is None:
+                return self._reply(413, {"message": "Payload Too Large"})
+            try:
+                rows = json.loads(body)
+            except ValueError as e:
+                return self._reply(400, {"message": f"invalid JSON: {e}"})
+            if table_name.startswith("rpc/"):
+                return self._rpc(table_name[len("rpc/"):], rows)
+            if isinstance(rows, dict):
+                rows = [rows]
+            on_conflict = dict(params).get("on_conflict")
+            key_columns = tuple(on_conflict.split(",")) if on_conflict else None
+            time.sleep(mock.latency + mock.row_latency * len(rows))
+            try:
+                with mock.lock:
+                    table = mock.tables.setdefault(table_name, MockTable(key_columns))
+                    table.upsert(rows)
+            except KeyError as e:
+                return self._reply(400, {"message": f"missing key column {e}"})
+            self._reply(201)
+
+        def _rpc(self, function, args):
+            time.sleep(mock.latency)
+            if function != "sync_prune_orphans":
+                return self._reply(404, {"message": f"function {function} not found"})
+            try:
+                self._reply(200, mock.prune_orphans(**args))
+            except (TypeError, ValueError) as e:
+                self._reply(400, {"message": str(e)})
+
+        def do_GET(self):
+            mock.count_request("GET")
+            if self._url_too_long():
+                return
+            table_name, params = self._parse()
+            if table_name is None:
+                return self._reply(404, {"message": "not found"})
+            options = dict(params)
+            select = options.get("select", "*")
+            order_columns = tuple(item.split(".")[0] for item in options.get("order", "").split(",") if item)
+            limit = int(options["limit"]) if "limit" in options else None
+            if mock.max_rows:
+                limit = min(limit or mock.max_rows, mock.max_rows)
+            time.sleep(mock.latency)
+            with mock.lock:
+                table = mock.tables.get(table_name)
+                rows = table.select(parse_filters(params), order_columns or table.key_columns,
+                                    limit) if table else []
+            if select != "*":
+                columns = select.split(",")
+                rows = [{col: row.get(col) for col in columns} for row in rows]
+            self._reply(200, rows)
+
+        def do_DELETE(self):
+            mock.count_request("DELETE")
+            if self._url_too_long():
+                return
+            table_name, params = self._parse()
+            if table_name is None:
+                return self._reply(404, {"message": "not found"})
+            filters = parse_filters(params)
+            if not filters[1]:
+                return self._reply(400, {"message": "DELETE requires a filter"})
+            with mock.lock:
+                table = mock.tables.get(table_name)
+                deleted = table.delete(filters) if table else 0
+            time.sleep(mock.latency + mock.row_latency * deleted)
+            self._reply(204)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청당 지연 (초)")
+    parser.add_argument("--row-latency", type=float, default=0.0, help="쓰기 행당 지연 (초)")
+    parser.add_argument("--max-rows", type=int, help="GET 응답 최대 행 수")
+    parser.add_argument("--max-url-bytes", type=int, help="이보다 긴 GET/DELETE 요청 경로에 414 응답")
+    parser.add_argument("--max-body-bytes", type=int, help="이보다 큰 POST 본문에 413 응답")
+    args = parser.parse_args()
+
+    with MockPostgREST(port=args.port, latency=args.latency, row_latency=args.row_latency,
+                       max_rows=args.max_rows, max_url_bytes=args.max_url_bytes,
+                       max_body_bytes=args.max_body_bytes) as mock:
+        print(f"🧪 PostgREST 스텁 실행 중: {mock.url} (Ctrl+C로 종료)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
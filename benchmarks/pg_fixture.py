@@ -0,0 +1,88 @@
+"""벤치마크용 로컬 PostgreSQL
+
+BENCH_PG_DSN이 설정되어 있으면 그 DB를 그대로 쓰고(테이블은 datagen이 다시 만든다),
+없으면 initdb/pg_ctl로 임시 디렉터리에 클러스터를 띄웠다가 끝나면 지운다.
+임시 클러스터는 trust 인증 + 유닉스 소켓만 사용하며 fsync를 끈다.
+initdb는 root로 실행할 수 없으므로 root 환경에서는 BENCH_PG_DSN을 써야 한다.
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+BENCH_DB_NAME = "qmarket_bench"
+BENCH_DB_USER = "bench"
+
+
+def _find_pg_bin(name):
+    """PATH, pg_config --bindir, /usr/lib/postgresql/*/bin 순서로 PostgreSQL 실행 파일 탐색"""
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = []
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.run([pg_config, "--bindir"], capture_output=True, text=True).stdout.strip()
+        candidates.append(os.path.join(bindir, name))
+    candidates.extend(sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"), reverse=True))
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise RuntimeError(f"{name}을(를) 찾을 수 없습니다. PostgreSQL을 설치하거나 BENCH_PG_DSN을 설정하세요.")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _dsn_params(dsn):
+    """DSN을 psycopg2.connect 키워드 인자로 변환"""
+    from psycopg2.extensions import parse_dsn
+
+    params = parse_dsn(dsn)
+    return {
+        "host": params.get("host", "localhost"),
+        "port": params.get("port", "5432"),
+        "dbname": params["dbname"],
+        "user": params.get("user", os.environ.get("USER", "postgres")),
+        "password": params.get("password", "")
+    }
+
+
+@contextmanager
+def local_postgres():
+    """psycopg2.connect(**params)에 넘길 접속 정보 dict를 돌려주는 컨텍스트 매니저"""
+    dsn = os.environ.get("BENCH_PG_DSN")
+    if dsn:
+        yield _dsn_params(dsn)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="sync_bench_pg_")
+    datadir = os.path.join(workdir, "data")
+    port = _free_port()
+    pg_ctl = _find_pg_bin("pg_ctl")
+    try:
+        subprocess.run([_find_pg_bin("initdb"), "-D", datadir, "-U", BENCH_DB_USER,
+                        "--auth=trust", "-E", "UTF8", "--no-locale"],
+                       check=True, capture_output=True)
+        options = f"-p {port} -k {workdir} -c listen_addresses='' -c fsync=off -c synchronous_commit=off"
+        subprocess.run([pg_ctl, "-D", datadir, "-o", options, "-l", os.path.join(workdir, "postgres.log"),
+                        "-w", "start"], check=True, capture_output=True)
+        subprocess.run([_find_pg_bin("createdb"), "-h", workdir, "-p", str(port),
+                        "-U", BENCH_DB_USER, BENCH_DB_NAME], check=True, capture_output=True)
+        yield {
+            "host": workdir,
+            "port": str(port),
+            "dbname": BENCH_DB_NAME,
+            "user": BENCH_DB_USER,
+            "password": BENCH_DB_USER  # trust 인증이라 실제로는 확인하지 않음
+        }
+    finally:
+        if os.path.exists(os.path.join(datadir, "postmaster.pid")):
+            subprocess.run([pg_ctl, "-D", datadir, "-m", "fast", "-w", "stop"], capture_output=True)
+        shutil.rmtree(workdir, ignore_errors=True)
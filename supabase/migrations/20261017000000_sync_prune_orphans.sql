@@ -0,0 +1,68 @@
+-- 서버 사이드 orphan 삭제 (sync_data.py의 prune_mode "rpc")
+--
+-- sync_data.py가 현재 소스 키를 sync_prune_keys에 run_id별로 올린 뒤
+-- sync_prune_orphans()를 한 번 호출하면, 대상 테이블에서 스테이징되지 않은 키의
+-- 행을 DELETE ... WHERE NOT EXISTS 한 번으로 지운다.
+-- 키는 text[]로 비교한다 (소스 값의 Python str()과 대상 컬럼의 ::text가 같아야 함).
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.sync_prune_keys (
+    run_id uuid NOT NULL,
+    table_name text NOT NULL,
+    key text[] NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sync_prune_keys_run_idx
+    ON public.sync_prune_keys (run_id, table_name, key);
+
+-- service_role만 사용 (RLS 정책이 없으므로 anon/authenticated는 접근 불가)
+ALTER TABLE public.sync_prune_keys ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.sync_prune_orphans(
+    p_run_id uuid,
+    p_table text,
+    p_key_columns text[],
+    p_expected_count bigint
+) RETURNS bigint
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    staged_count bigint;
+    deleted_count bigint;
+    key_expr text;
+BEGIN
+    -- 키 업로드가 중간에 끊긴 경우 살아있는 행을 지우지 않도록 개수부터 확인
+    SELECT count(*) INTO staged_count
+    FROM sync_prune_keys
+    WHERE run_id = p_run_id AND table_name = p_table;
+
+    IF staged_count <> p_expected_count THEN
+        RAISE EXCEPTION 'sync_prune_orphans: % keys staged for %, expected %',
+            staged_count, p_table, p_expected_count;
+    END IF;
+
+    SELECT string_agg(format('t.%I::text', col), ', ' ORDER BY ord)
+    INTO key_expr
+    FROM unnest(p_key_columns) WITH ORDINALITY AS c(col, ord);
+
+    EXECUTE format(
+        'DELETE FROM public.%I AS t
+         WHERE NOT EXISTS (
+             SELECT 1 FROM sync_prune_keys k
+             WHERE k.run_id = $1 AND k.table_name = $2 AND k.key = ARRAY[%s]
+         )', p_table, key_expr)
+    USING p_run_id, p_table;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+    -- 이번 실행 키와, 실패한 이전 실행이 남긴 오래된 키 정리
+    DELETE FROM sync_prune_keys
+    WHERE run_id = p_run_id OR created_at < now() - interval '1 day';
+
+    RETURN deleted_count;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.sync_prune_orphans(uuid, text, text[], bigint) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.sync_prune_orphans(uuid, text, text[], bigint) TO service_role;
@@ -1,25 +1,131 @@
 import os
+import sys
+import argparse
+import asyncio
 import csv
 import json
+import gzip
+import hashlib
+import queue
+import random
+import shutil
+import threading
+import uuid
 import requests
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
-from datetime import datetime
+from psycopg2 import sql as pgsql
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # 선택 의존성: 있으면 배치 JSON 인코딩에 사용
+except ImportError:
+    orjson = None
+try:
+    import numpy as np  # 선택 의존성: orphan 판단용 정수 키를 정렬된 int64 배열로 보관
+except ImportError:
+    np = None
+try:
+    import aiohttp  # 선택 의존성: upload_engine "async"에서 사용
+except ImportError:
+    aiohttp = None
+from datetime import date, datetime, time, timedelta
+from time import perf_counter, sleep
+from decimal import Decimal
 from io import StringIO
+from urllib.parse import urlencode
 
 # --- 환경 변수 및 설정 ---
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+# Supabase Postgres 직접 접속 문자열 (loader "direct"에서 사용, 없으면 REST API로 업로드)
+SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
 
-# 외부 PostgreSQL DB 접속 정보
-DB_HOST = "pg-3ae9p5.vpc-cdb-kr.ntruss.com"
-DB_PORT = "5432"
-DB_NAME = "qmarket"
-DB_USER = "hansol"
+# 외부 PostgreSQL DB 접속 정보 (로컬 벤치마크 등에서는 환경 변수로 덮어쓸 수 있음)
+DB_HOST = os.environ.get("DB_HOST", "pg-3ae9p5.vpc-cdb-kr.ntruss.com")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+DB_NAME = os.environ.get("DB_NAME", "qmarket")
+DB_USER = os.environ.get("DB_USER", "hansol")
 
 # --- 배치 및 임시 파일 설정 ---
-BATCH_SIZE = 1000
-TEMP_DIR = "/tmp" 
+BATCH_SIZE = 1000  # 초기(고정 모드에서는 항상) 배치 행 수
+# 추출 파일 위치. 워크플로에서는 .sync_state 아래로 지정해 실패한 실행의 추출 파일과 체크포인트를 함께 캐시함
+TEMP_DIR = os.environ.get("SYNC_TEMP_DIR", "/tmp")
+# 적응형 배치: 응답이 빠르면 키우고, 느리거나 413/타임아웃이면 줄임 (테이블별로 덮어쓸 수 있음)
+ADAPTIVE_BATCHING = True
+BATCH_MAX_BYTES = 1024 * 1024  # 배치 JSON 본문 목표 상한 (bytes, 압축 전)
+BATCH_TARGET_LATENCY = 2.0  # 배치 요청 하나의 목표 응답 시간 (초)
+BATCH_413_BYTES_RATIO = 0.8  # 413을 받으면 max_bytes를 거부된 본문 크기의 이 비율 이하로 낮춤
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 10000
+UPLOAD_CONCURRENCY = 4  # 동시에 전송 중인 배치 요청 최대 수 (1이면 순차 전송)
+SYNC_WORKERS = 3  # 동시에 동기화할 테이블 수 (1이면 순차 실행)
+# 업로드/삭제 엔진: "thread"(requests + 스레드 풀) | "async"(asyncio + aiohttp, pip install aiohttp 필요)
+DEFAULT_UPLOAD_ENGINE = os.environ.get("SYNC_UPLOAD_ENGINE", "thread")
+ASYNC_UPLOAD_CONCURRENCY = 32  # async 엔진의 기본 동시 요청 수 (요청마다 스레드가 없어 크게 잡아도 가벼움)
+
+# --- 추출 설정 ---
+# "stream": 서버 사이드(named) 커서로 itersize 단위씩 가져옴 (메모리 일정)
+# "buffered": 일반 커서로 전체 결과를 클라이언트 메모리에 적재
+# "copy": COPY (...) TO STDOUT WITH CSV HEADER 결과를 파일로 바로 기록
+DEFAULT_EXTRACT_MODE = "stream"
+DEFAULT_ITERSIZE = 5000  # named 커서가 한 번에 가져오는 행 수
+COPY_BUFFER_SIZE = 1024 * 1024  # copy_expert 읽기 버퍼 크기 (bytes)
+# "csv": 임시 CSV 파일로 전부 추출한 뒤 업로드
+# "stream": DB 커서에서 읽은 행을 바로 업로드 배치로 흘려보냄 (추출과 업로드가 겹침)
+DEFAULT_PIPELINE = "csv"
+KEEP_DEBUG_CSV = os.environ.get("SYNC_KEEP_CSV") == "1"  # stream 파이프라인에서도 CSV 사본을 남김
+CHECKPOINTS = True  # csv 파이프라인 업로드 진행 위치를 기록해 --resume으로 재개 가능하게 함
+CHECKPOINT_MAX_AGE_HOURS = 24  # 이보다 오래된 추출 파일로는 재개하지 않음 (오래된 데이터 업로드/삭제 방지)
+# 범위 분할 추출: 테이블 설정에 "partition"이 있으면 전체 동기화 때 구간별로 연결을 따로 열어 동시에 추출
+DEFAULT_PARTITION_COUNT = 4  # partition 설정에 count가 없을 때 나눌 구간 수 (= 동시 소스 연결 수)
+PARTITION_QUEUE_SIZE = 8  # stream 파이프라인에서 파티션 추출 스레드가 미리 쌓아 둘 청크 수
+
+# --- HTTP 설정 ---
+HTTP_POOL_SIZE = 16  # 호스트당 유지할 keep-alive 커넥션 수 (SYNC_WORKERS * UPLOAD_CONCURRENCY 이상)
+HTTP_TIMEOUT = 120  # 요청 하나의 타임아웃 (초). 배치 업로드 타임아웃은 배치를 반으로 나눠 재전송
+# 일시적 오류 재시도: 연결 오류와 아래 상태 코드는 지수 백오프(+지터)로 재시도
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0  # 첫 재시도 대기 상한 (초), 시도마다 2배
+RETRY_MAX_DELAY = 30.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 데이터 오류로 보이는 상태 코드: 배치를 반씩 나눠 문제 행만 골라내고 나머지는 전송
+BISECT_STATUS_CODES = {400, 409, 422}
+MAX_REJECTED_ROWS = 100  # 테이블당 거부 행이 이보다 많으면 업로드 중단
+UPSERT_HEADERS = {"Prefer": "resolution=merge-duplicates"}  # upsert 동작 명시
+JSON_ENCODER = os.environ.get("SYNC_JSON_ENCODER", "auto")  # "auto" | "orjson" | "stdlib"
+# 요청 본문 gzip 압축 레벨 (0이면 압축 안 함). 게이트웨이가 Content-Encoding: gzip을 받아야 함
+GZIP_LEVEL = int(os.environ.get("SYNC_GZIP_LEVEL", "0"))
+GZIP_UPSERT_HEADERS = dict(UPSERT_HEADERS, **{"Content-Encoding": "gzip"})
+DELETE_CHUNK_SIZE = 200  # DELETE 요청 하나에 묶을 orphan 키 수 (URL 길이 제한 고려)
+# DELETE 필터 쿼리 문자열(퍼센트 인코딩 후) 상한. 넘으면 묶음을 반씩 나누고, 414를 받아도 반씩 나눠 재시도
+DELETE_MAX_URL_BYTES = 6000
+KEY_SCAN_PAGE_SIZE = 1000  # 기존 키 조회 페이지 크기 (PostgREST max-rows 이하로 유지)
+# orphan 삭제 방식: "scan"(키를 내려받아 비교 후 DELETE) | "rpc"(키를 스테이징 테이블에 올리고
+# 서버 함수가 한 번에 삭제, supabase/migrations/*_sync_prune_orphans.sql 적용 필요)
+DEFAULT_PRUNE_MODE = os.environ.get("SYNC_PRUNE_MODE", "scan")
+PRUNE_STAGING_TABLE = "sync_prune_keys"
+PRUNE_RPC_FUNCTION = "sync_prune_orphans"
+PRUNE_STAGE_BATCH_SIZE = 5000  # 스테이징 INSERT 요청 하나에 담을 키 수
+# 적재 방식: "rest"(PostgREST로 배치 upsert) | "direct"(SUPABASE_DB_URL로 COPY + upsert + 삭제를 한 트랜잭션에)
+#          | "swap"(섀도 테이블에 전체를 적재한 뒤 이름을 바꿔 한 번에 교체, 매번 전체를 다시 계산하는 테이블용)
+DEFAULT_LOADER = "rest"
+DIRECT_STATEMENT_TIMEOUT = "30min"  # 직접 적재 트랜잭션의 statement_timeout
+SWAP_LOCK_TIMEOUT = "10s"  # 테이블 교체 시 ACCESS EXCLUSIVE 잠금 대기 상한 (넘으면 롤백, 읽기 요청이 줄 서지 않게)
+
+# --- 상태 파일 설정 (워터마크 등 실행 간에 유지할 값) ---
+STATE_DIR = os.environ.get("SYNC_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sync_state"))
+FULL_RESYNC = os.environ.get("FULL_RESYNC") == "1"  # 1이면 증분 테이블도 전체 재동기화
+
+# --- 실행 모드 (CLI에서 덮어씀) ---
+DRY_RUN = False  # True면 조회는 하되 Supabase 쓰기(POST/DELETE)와 상태 파일 저장은 하지 않음
+ALL_PHASES = ("extract", "upload", "prune")
+REPORT_PATH = os.environ.get("SYNC_REPORT_PATH", "sync_report.json")  # 실행 리포트(JSON) 경로, 빈 값이면 저장 안 함
 
 # --- SQL 쿼리 정의 및 Supabase 테이블 이름 매핑 ---
 QUERIES = {
@@ -53,7 +159,9 @@ QUERIES = {
         """,
         "on_conflict": "user_id",
         "delete_orphans": True,  # 소스에 없는 데이터 삭제
-        "key_columns": ["user_id"]  # 삭제 시 비교할 키
+        "key_columns": ["user_id"],  # 삭제 시 비교할 키
+        "change_detection": True,  # 이전 실행 스냅샷과 비교해 바뀐 행만 전송
+        "pipeline": "stream"  # 임시 CSV 없이 추출과 업로드를 동시에 진행
     },
     
     "coupons": {
@@ -72,7 +180,11 @@ QUERIES = {
         """,
         "on_conflict": "user_id",
         "delete_orphans": True,
-        "key_columns": ["user_id"]
+        "key_columns": ["user_id"],
+        "change_detection": True,
+        "pipeline": "stream",
+        # 매번 전체를 다시 계산하므로 SUPABASE_DB_URL이 있으면 섀도 테이블로 통째로 교체
+        "loader": "swap"
     },
     
     "orders": {
@@ -92,193 +204,2484 @@ QUERIES = {
         """,
         "on_conflict": "user_id,order_id",  # 복합키로 수정
         "delete_orphans": True,
-        "key_columns": ["user_id", "order_id"]
+        "key_columns": ["user_id", "order_id"],
+        "extract_mode": "copy",
+        "itersize": 20000,  # 행이 작으므로 더 크게 가져옴
+        "loader": "direct",  # SUPABASE_DB_URL이 있으면 REST API 대신 Postgres에 직접 적재
+        # 전체 동기화 때 1년치를 order_date 구간 4개로 나눠 소스 연결 4개에서 동시에 추출
+        "partition": {
+            "column": "order_date",
+            "bounds_sql": "SELECT CURRENT_DATE - INTERVAL '1 year', now()::timestamp",
+            "count": 4
+        },
+        "batch_size": 5000,  # 행이 작으므로 큰 배치로 시작 (이후 자동 조절)
+        # 증분 동기화: 마지막 order_date 이후 행만 추출 (FULL_RESYNC=1이면 전체 + orphan 삭제)
+        "incremental": {
+            "column": "order_date",
+            "lookback": "3 days",  # 생성 후 늦게 결제 완료된 주문을 다시 읽기 위한 여유 구간
+            "full_resync_days": 7  # 이 주기로 전체 동기화해 취소/환불되거나 1년을 넘긴 주문 삭제
+        }
     }
 }
 
-def extract_db_to_csv(query_config, temp_filename):
-    """외부 DB에서 쿼리를 실행하고 CSV 파일로 저장"""
+# --- 로그 출력 ---
+_log_context = threading.local()
+
+def log(message):
+    """진행 상황 출력 (테이블 병렬 동기화 중에는 줄마다 [테이블] 접두어를 붙임)"""
+    prefix = getattr(_log_context, "prefix", "")
+    if prefix:
+        message = "\n".join(f"{prefix}{line}" if line else line for line in message.split("\n"))
+    print(message, flush=True)
+
+def _set_log_prefix(prefix):
+    """현재 스레드의 로그 접두어 설정 (워커 스레드 initializer로도 사용)"""
+    _log_context.prefix = prefix
+
+# --- 계측 ---
+def _percentile(sorted_values, pct):
+    """정렬된 값의 nearest-rank 백분위수"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class TableMetrics:
+    """테이블 하나의 단계별 시간, 행/요청 수, 전송 바이트, 요청 지연 시간 집계
+
+    업로드 워커 스레드들이 함께 갱신하므로 모든 변경은 lock으로 보호한다.
+    단계 시간은 누적값이며, stream 파이프라인에서는 extract와 upload 시간이 겹친다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase_seconds = {}
+        self.counters = {}
+        self.latencies = {}
+
+    @contextmanager
+    def timer(self, phase):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, perf_counter() - started)
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_latency(self, kind, seconds):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+
+    def get(self, name):
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def to_dict(self):
+        """JSON 리포트용 요약 (시간은 초, 지연 시간은 밀리초)"""
+        with self._lock:
+            phases = {name: round(sec, 3) for name, sec in self.phase_seconds.items()}
+            counters = dict(self.counters)
+            latencies = {kind: sorted(values) for kind, values in self.latencies.items()}
+
+        throughput = {}
+        for phase, counter in (("extract", "rows_extracted"), ("upload", "rows_uploaded"),
+                               ("prune", "orphans_deleted")):
+            if self.phase_seconds.get(phase) and counters.get(counter):
+                throughput[f"{phase}_rows_per_sec"] = round(counters[counter] / self.phase_seconds[phase], 1)
+
+        latency_ms = {}
+        for kind, values in latencies.items():
+            latency_ms[kind] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values) * 1000, 1),
+                **{f"p{pct}": round(_percentile(values, pct) * 1000, 1) for pct in (50, 90, 99)},
+                "max": round(values[-1] * 1000, 1)
+            }
+        return {"phase_seconds": phases, "counters": counters,
+                "throughput": throughput, "latency_ms": latency_ms}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def get_metrics(table_name):
+    """테이블별 TableMetrics (없으면 생성)"""
+    with _metrics_lock:
+        if table_name not in _metrics:
+            _metrics[table_name] = TableMetrics()
+        return _metrics[table_name]
+
+def reset_metrics():
+    """모든 테이블 계측값 초기화 (한 프로세스에서 여러 번 실행할 때)"""
+    with _metrics_lock:
+        _metrics.clear()
+
+# --- 상태 파일 ---
+_state_lock = threading.Lock()
+
+def _state_path(name):
+    return os.path.join(STATE_DIR, f"{name}.json")
+
+def load_state(name):
+    """STATE_DIR/<name>.json 내용을 dict로 반환 (없으면 빈 dict)"""
+    path = _state_path(name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(name, state, indent=2):
+    """상태 dict를 저장 (임시 파일에 쓴 뒤 교체해 중간에 죽어도 깨지지 않음)
+
+    dry-run에서는 실제로 올리지 않은 결과를 기록하지 않도록 저장하지 않는다.
+    """
+    if DRY_RUN:
+        return
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = _state_path(name) + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, _state_path(name))
+
+def update_state(name, key, value):
+    """상태 파일의 key 값 하나를 갱신 (value가 None이면 삭제)"""
+    with _state_lock:
+        state = load_state(name)
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = value
+        save_state(name, state)
+
+class WatermarkTracker:
+    """업로드되는 행에서 워터마크 컬럼의 최댓값을 추적
+
+    거부된 행(exclude)이 있으면 그 값이 저장할 워터마크의 상한이 되어, 다음 증분 실행에서
+    lookback 구간 안으로 다시 읽혀 재전송된다.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.value = None
+        self.ceiling = None
+
+    def _text(self, row):
+        # ISO 형식 문자열로 맞춰 두면 문자열 비교가 시간 순서와 같다
+        value = row.get(self.column)
+        if value is None or value == "":
+            return None
+        return str(value)
+
+    def observe(self, row):
+        value = self._text(row)
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def exclude(self, rows):
+        """업로드되지 않은 행 (직렬화된 ISO 값 'T' 구분자는 관찰할 때의 공백 형식으로 되돌림)"""
+        for row in rows:
+            value = self._text(row)
+            if value is None:
+                continue
+            if value[10:11] == "T":
+                value = f"{value[:10]} {value[11:]}"
+            if self.ceiling is None or value < self.ceiling:
+                self.ceiling = value
+
+    def watermark(self):
+        """저장할 워터마크 (관찰한 최댓값, 거부된 행이 있으면 그 값을 넘지 않음)"""
+        if self.value is None or self.ceiling is None:
+            return self.value
+        return min(self.value, self.ceiling)
+
+KEY_SEPARATOR = "\x1f"  # 스냅샷에서 복합키 값을 이어 붙일 때 쓰는 구분자
+
+def _row_digest(row):
+    """행 전체 값의 짧은 해시 (NULL과 빈 문자열은 같은 값으로 취급)"""
+    payload = KEY_SEPARATOR.join("" if v is None else str(v) for v in row.values())
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+class ChangeDetector:
+    """이전 실행의 스냅샷(키 → 행 해시)과 비교해 새 행/변경된 행만 통과시킴
+
+    스냅샷은 STATE_DIR/snapshot_<table>.json에 저장되며, 이번 실행에서 보이지 않은
+    스냅샷 키가 곧 orphan이다. 스냅샷이 없으면(첫 실행, FULL_RESYNC) 모든 행을 통과시킨다.
+    """
+
+    def __init__(self, table_name, key_columns, use_previous=True):
+        self.state_name = f"snapshot_{table_name}"
+        self.key_columns = key_columns
+        self.previous = load_state(self.state_name) if use_previous else {}
+        self.has_previous = bool(self.previous)
+        self.current = {}
+        self.skipped = 0
+
+    def filter(self, rows):
+        for row in rows:
+            key = KEY_SEPARATOR.join(str(row[col]) for col in self.key_columns)
+            digest = _row_digest(row)
+            self.current[key] = digest
+            if self.previous.get(key) == digest:
+                self.skipped += 1
+                continue
+            yield row
+
+    def mark_unsent(self, rows):
+        """업로드되지 않은 행은 빈 해시로 기록해 다음 실행에서 다시 보내도록 함 (orphan은 아님)"""
+        for row in rows:
+            self.current[KEY_SEPARATOR.join(str(row[col]) for col in self.key_columns)] = ""
+
+    def orphan_keys(self):
+        return [tuple(key.split(KEY_SEPARATOR)) for key in self.previous if key not in self.current]
+
+    def save(self):
+        save_state(self.state_name, self.current, indent=None)
+
+def _int_key(value):
+    """키 값을 0 이상 정수로 변환 (str()이 원래 값과 같을 때만, 아니면 ValueError)"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        if value < 0:
+            raise ValueError(value)
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit() and (value == "0" or value[0] != "0"):
+        return int(value)
+    raise ValueError(value)
+
+class KeyIndex:
+    """orphan 판단에 쓰는 현재 소스 키 집합
+
+    키가 모두 0 이상 정수면 컬럼별 array('q')에 모았다가 처음 조회할 때 정렬된 NumPy int64
+    배열로 만든다 (복합키는 컬럼 값의 비트를 이어 붙여 int64 하나로 묶음). 키당 수백 바이트인
+    문자열 튜플 set 대신 8바이트만 쓰고, 기존 키 페이지와의 차집합은 searchsorted로 한 번에 구한다.
+    numpy가 없거나, 정수가 아닌 키가 나오거나, 묶은 비트가 63을 넘으면 문자열 튜플 set을 쓴다.
+    "007", "+7"처럼 str()로 되돌렸을 때 달라지는 표기는 양쪽 모두 정수로 보지 않으므로(_int_key)
+    키는 어느 쪽이든 str() 값 기준으로 비교되고 set만 쓰던 때와 결과가 같다.
+    """
+
+    def __init__(self, key_columns):
+        self.key_columns = key_columns
+        self._columns = [array('q') for _ in key_columns] if np is not None else None
+        self._set = None if np is not None else set()
+        self._sorted = None  # 정렬/중복 제거된 int64 배열
+        self._bits = None  # 복합키 컬럼별 비트 수
+
+    def add(self, row):
+        if self._set is None and self._sorted is None:
+            try:
+                values = [_int_key(row[col]) for col in self.key_columns]
+                for column, value in zip(self._columns, values):
+                    column.append(value)
+                return
+            except (ValueError, OverflowError):
+                self._to_set()
+        elif self._sorted is not None:
+            self._to_set()
+        self._set.add(tuple(str(row[col]) for col in self.key_columns))
+
+    def _to_set(self):
+        """문자열 튜플 set 모드로 전환"""
+        self._set = set(self._iter_int_keys())
+        self._columns = None
+        self._sorted = None
+
+    def _freeze(self):
+        """모은 정수 키를 정렬된 int64 배열로 변환 (이미 변환했거나 set 모드면 그대로)"""
+        if self._set is not None or self._sorted is not None:
+            return
+        columns = [np.frombuffer(column, dtype=np.int64) for column in self._columns]
+        if len(columns) == 1:
+            self._bits = [63]
+            packed = columns[0]
+        else:
+            self._bits = [max(1, int(column.max()).bit_length()) if len(column) else 1
+                          for column in columns]
+            if sum(self._bits) > 63:
+                self._to_set()
+                return
+            packed = columns[0].copy()
+            for column, bits in zip(columns[1:], self._bits[1:]):
+                packed <<= bits
+                packed |= column
+        packed = np.sort(packed)  # np.unique는 해시 기반이라 큰 배열에서 정렬 후 중복 제거보다 느림
+        if len(packed) > 1:
+            packed = packed[np.concatenate(([True], packed[1:] != packed[:-1]))]
+        self._sorted = packed
+        self._columns = None
+
+    def _iter_int_keys(self):
+        """정수 모드 키를 문자열 튜플로 반환"""
+        if self._sorted is None:
+            yield from zip(*([str(v) for v in column] for column in self._columns))
+            return
+        columns = []
+        packed = self._sorted
+        for bits in reversed(self._bits[1:]):
+            columns.append(packed & ((1 << bits) - 1))
+            packed = packed >> bits
+        columns.append(packed)
+        yield from zip(*([str(v) for v in column.tolist()] for column in reversed(columns)))
+
+    def _pack(self, keys):
+        """문자열 튜플 키 목록을 (int64 배열, 유효 여부 배열)로 변환 (_int_key가 거부하는 값이나 범위 밖이면 무효)"""
+        strings = np.array(keys, dtype=str).reshape(len(keys), len(self.key_columns))
+        try:
+            values = strings.astype(np.int64)
+            # "007"이나 "+7"은 정수로는 7이지만 str 비교로는 "7"과 다른 키이므로 무효
+            valid = ((values >= 0) & (values.astype(str) == strings)).all(axis=1)
+        except (ValueError, OverflowError):
+            # 정수가 아닌 키가 섞인 페이지는 키마다 확인
+            values = np.zeros((len(keys), len(self.key_columns)), dtype=np.int64)
+            valid = np.zeros(len(keys), dtype=bool)
+            for i, key in enumerate(keys):
+                try:
+                    values[i] = [_int_key(v) for v in key]
+                    valid[i] = True
+                except (ValueError, OverflowError):
+                    pass
+        packed = values[:, 0].copy()
+        for i, bits in enumerate(self._bits[1:], start=1):
+            valid &= values[:, i] < (1 << bits)
+            packed <<= bits
+            packed |= values[:, i]
+        if len(self._bits) > 1:
+            valid &= values[:, 0] < (1 << self._bits[0])
+        return packed, valid
+
+    def missing(self, keys):
+        """keys(문자열 튜플 목록) 중 인덱스에 없는 키 목록"""
+        self._freeze()
+        if self._set is not None:
+            return [key for key in keys if key not in self._set]
+        if not keys:
+            return []
+        if not len(self._sorted):
+            return list(keys)
+        packed, valid = self._pack(keys)
+        positions = np.minimum(np.searchsorted(self._sorted, packed), len(self._sorted) - 1)
+        found = valid & (self._sorted[positions] == packed)
+        return [key for key, hit in zip(keys, found.tolist()) if not hit]
+
+    def __contains__(self, key):
+        return not self.missing([key])
+
+    def __len__(self):
+        self._freeze()
+        return len(self._set) if self._set is not None else len(self._sorted)
+
+    def __iter__(self):
+        self._freeze()
+        return iter(self._set) if self._set is not None else self._iter_int_keys()
+
+def _base_sql(query_config):
+    """서브쿼리로 감쌀 수 있도록 끝의 세미콜론을 제거한 SQL"""
+    return query_config['sql'].strip().rstrip(';')
+
+def _extract_query(query_config, watermark=None):
+    """실제로 실행할 (SQL, 파라미터) 반환
+
+    watermark가 있으면 원래 쿼리를 서브쿼리로 감싸 워터마크(- lookback) 이후 행만
+    고른다. 조건이 GROUP BY 컬럼에 걸리므로 Postgres가 원본 테이블 스캔까지 내려 보낸다.
+    """
+    incremental = query_config.get("incremental")
+    if not (incremental and watermark):
+        return query_config['sql'], None
+
+    sql = (f"SELECT * FROM ({_base_sql(query_config)}) AS src "
+           f"WHERE src.{incremental['column']} > "
+           f"(%(watermark)s::timestamp - %(lookback)s::interval)")
+    params = {"watermark": watermark, "lookback": incremental.get("lookback", "0")}
+    return sql, params
+
+def _split_range(low, high, count):
+    """low~high를 count개 구간으로 나누는 내부 경계값 목록 (정수, 소수, 날짜/시각 지원)"""
+    if low is None or high is None or count < 2 or not low < high:
+        return []
+    if isinstance(low, int):
+        bounds = [low + (high - low) * i // count for i in range(1, count)]
+    else:
+        step = (high - low) / count
+        bounds = [low + step * i for i in range(1, count)]
+    return sorted({bound for bound in bounds if low < bound <= high})
+
+def _partition_queries(conn, query_config, watermark=None):
+    """추출 쿼리를 partition 설정에 따라 구간별 (SQL, 파라미터) 목록으로 나눔
+
+    partition = {"column": 결과 컬럼, "bounds_sql": (최솟값, 최댓값) 한 행을 돌려주는 쿼리,
+    "count": 구간 수}. bounds_sql 범위를 균등하게 나누되 첫/마지막 구간은 열어 두어 범위 밖 값과
+    NULL도 빠지지 않게 한다. 조건이 GROUP BY 컬럼에 걸리면 Postgres가 원본 테이블 스캔까지
+    내려 보낸다. 설정이 없거나 증분 실행(범위가 작음)이면 쿼리 1개를 그대로 반환한다.
+    """
+    sql, params = _extract_query(query_config, watermark)
+    partition = query_config.get("partition")
+    if not partition or watermark:
+        return [(sql, params)]
+
+    with conn.cursor() as cursor:
+        cursor.execute(partition["bounds_sql"])
+        low, high = cursor.fetchone()
+    bounds = _split_range(low, high, partition.get("count", DEFAULT_PARTITION_COUNT))
+    if not bounds:
+        return [(sql, params)]
+
+    column = partition["column"]
+    base = sql.strip().rstrip(';')
+    edges = [None] + bounds + [None]
+    queries = []
+    for start, end in zip(edges, edges[1:]):
+        part_params = dict(params or {})
+        conditions = []
+        if start is not None:
+            conditions.append(f"part.{column} >= %(part_start)s")
+            part_params["part_start"] = start
+        if end is not None:
+            conditions.append(f"part.{column} < %(part_end)s")
+            part_params["part_end"] = end
+        where = " AND ".join(conditions)
+        if start is None:
+            where = f"({where} OR part.{column} IS NULL)"
+        queries.append((f"SELECT * FROM ({base}) AS part WHERE {where}", part_params))
+    return queries
+
+def _note_partitions(metrics, query_config, count):
+    """구간 분할 추출 시작 로그와 계측"""
+    log(f"🔀 {query_config['partition']['column']} 기준 {count}개 구간 동시 추출")
+    metrics.incr("partitions", count)
+
+def _iter_partition_chunks(queries, produce):
+    """파티션마다 별도 소스 연결 스레드에서 produce(conn, sql, params, emit)를 실행하고
+    emit으로 넘어온 청크를 도착 순서대로 반환
+
+    큐가 PARTITION_QUEUE_SIZE만큼 차면 추출 스레드가 기다리므로 메모리는 일정하다.
+    한 파티션이 실패하거나 소비 쪽이 먼저 끝나면 나머지 쿼리를 취소하고 스레드를 정리한다.
+    """
+    chunks = queue.Queue(maxsize=PARTITION_QUEUE_SIZE)
+    stop = threading.Event()
+    conns = []
+    done = object()
+
+    def emit(chunk):
+        while not stop.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("파티션 추출 중단")
+
+    def run(sql, params):
+        conn = None
+        try:
+            conn = _connect_source()
+            conns.append(conn)
+            produce(conn, sql, params, emit)
+            result = done
+        except Exception as e:
+            result = e
+        finally:
+            if conn:
+                conn.close()
+        try:
+            emit(result)
+        except RuntimeError:
+            pass
+
+    threads = [threading.Thread(target=run, args=query, daemon=True) for query in queries]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            chunk = chunks.get()
+            if chunk is done:
+                remaining -= 1
+            elif isinstance(chunk, Exception):
+                raise chunk
+            else:
+                yield chunk
+    finally:
+        stop.set()
+        for conn in conns:
+            try:
+                conn.cancel()
+            except psycopg2.Error:
+                pass
+        for thread in threads:
+            thread.join()
+
+# --- 타입 변환 (직렬화) ---
+# cursor.description의 type_code(Postgres 타입 OID)별 변환 종류
+PG_TYPE_KINDS = {
+    16: "bool",
+    20: "int", 21: "int", 23: "int", 26: "int",
+    700: "float", 701: "float", 1700: "numeric",
+    1082: "temporal", 1083: "temporal", 1114: "temporal", 1184: "temporal", 1266: "temporal",
+    114: "json", 3802: "json",
+    1005: "int_array", 1007: "int_array", 1016: "int_array",
+    1021: "float_array", 1022: "float_array", 1231: "numeric_array"
+}
+
+def _text_or_none(parse):
+    """CSV의 빈 값(NULL)은 None으로, 나머지는 parse로 변환하는 함수 생성"""
+    return lambda v: None if v == "" else parse(v)
+
+def _parse_numeric_text(v):
+    # 정수가 아니면 float로 바꾸지 않고 문자열 그대로 보냄 (PostgREST가 numeric으로 정확히 캐스팅)
+    try:
+        return int(v)
+    except ValueError:
+        return v
+
+def _parse_array_text(parse_item):
+    # COPY는 '{1,2,3}', csv.writer는 '[1, 2, 3]' 형태로 기록한다
+    def parse(v):
+        inner = v[1:-1].strip()
+        if not inner:
+            return []
+        return [None if item.strip() in ("NULL", "None") else parse_item(item.strip())
+                for item in inner.split(",")]
+    return parse
+
+def _decimal_to_json(v):
+    # float는 15자리 정도에서 정밀도를 잃으므로 정수가 아닌 값(NaN/Infinity 포함)은 문자열로
+    if v is None:
+        return None
+    return int(v) if v.is_finite() and v == v.to_integral_value() else str(v)
+
+def _temporal_to_json(v):
+    return None if v is None else v.isoformat()
+
+# CSV 문자열 → JSON 값
+TEXT_CONVERTERS = {
+    "bool": _text_or_none(lambda v: v in ("t", "true", "True", "1")),
+    "int": _text_or_none(int),
+    "float": _text_or_none(float),
+    "numeric": _text_or_none(_parse_numeric_text),
+    "temporal": _text_or_none(lambda v: v.replace(" ", "T", 1)),
+    "json": _text_or_none(json.loads),
+    "int_array": _text_or_none(_parse_array_text(int)),
+    "float_array": _text_or_none(_parse_array_text(float)),
+    "numeric_array": _text_or_none(_parse_array_text(_parse_numeric_text))
+}
+
+def _numeric_array_to_csv(v):
+    return None if v is None else "[" + ", ".join("None" if x is None else str(x) for x in v) + "]"
+
+# psycopg2가 돌려준 파이썬 값 → csv.writer로 기록할 문자열 (str()로는 다시 읽을 수 없는 값만)
+# json은 파이썬 repr({'a': 1}), numeric 배열은 [Decimal('1.5')]로 기록되기 때문
+CURSOR_CSV_CONVERTERS = {
+    "json": lambda v: None if v is None else json.dumps(v, ensure_ascii=False),
+    "numeric_array": _numeric_array_to_csv
+}
+
+# psycopg2가 돌려준 파이썬 값 → JSON 값 (int, bool, list, None은 그대로)
+NATIVE_CONVERTERS = {
+    "numeric": _decimal_to_json,
+    "temporal": _temporal_to_json,
+    "numeric_array": lambda v: None if v is None else [_decimal_to_json(x) for x in v]
+}
+
+class RowSerializer:
+    """컬럼 타입 OID로 컬럼별 변환 함수를 한 번만 골라 두고 행 dict를 JSON 값으로 변환
+
+    source가 "text"면 CSV 문자열을, "native"면 psycopg2 파이썬 값을 변환한다.
+    변환이 필요 없는 컬럼은 건너뛰므로 행마다 타입 분기가 일어나지 않는다.
+    컬럼 정보가 없으면(set_columns 전) 행을 그대로 통과시킨다.
+    """
+
+    def __init__(self, source, columns=None):
+        self.converters = TEXT_CONVERTERS if source == "text" else NATIVE_CONVERTERS
+        self.plan = []
+        if columns:
+            self.set_columns(columns)
+
+    def set_columns(self, columns):
+        """columns: [(컬럼명, 타입 OID), ...]"""
+        self.plan = [(name, self.converters[PG_TYPE_KINDS[oid]])
+                     for name, oid in columns
+                     if PG_TYPE_KINDS.get(oid) in self.converters]
+
+    def serialize(self, rows):
+        for row in rows:
+            for name, convert in self.plan:
+                row[name] = convert(row[name])
+            yield row
+
+def _json_default(v):
+    """JSON 인코더가 기본으로 처리하지 못하는 값 변환"""
+    if isinstance(v, Decimal):
+        return _decimal_to_json(v)
+    if isinstance(v, (datetime, date, time)):
+        return v.isoformat()
+    return str(v)
+
+def _encode_json_stdlib(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"),
+                      default=_json_default).encode('utf-8')
+
+def _encode_json_orjson(data):
+    return orjson.dumps(data, default=_json_default)
+
+def get_json_encoder(name=None):
+    """배치 payload를 bytes로 인코딩하는 함수 반환
+
+    "auto"는 orjson이 설치되어 있으면 orjson, 없으면 표준 json을 쓴다.
+    orjson은 C 구현이고 str을 거치지 않고 바로 UTF-8 bytes를 만든다.
+    """
+    name = name or JSON_ENCODER
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise ValueError("orjson이 설치되어 있지 않습니다.")
+        return _encode_json_orjson
+    return _encode_json_stdlib
+
+encode_json = get_json_encoder()
+
+def _description_columns(description):
+    return [(desc[0], desc[1]) for desc in description or []]
+
+def _columns_path(filepath):
+    """CSV 옆에 저장하는 컬럼 타입 정보 파일 경로"""
+    return filepath + ".columns.json"
+
+def _connect_source():
+    """외부(소스) PostgreSQL 연결"""
+    return psycopg2.connect(
+        host=DB_HOST, database=DB_NAME, user=DB_USER, 
+        password=DB_PASSWORD, port=DB_PORT
+    )
+
+def _connect_target():
+    """Supabase(대상) PostgreSQL 직접 연결 (loader "direct")"""
+    return psycopg2.connect(SUPABASE_DB_URL)
+
+def _write_csv_with_cursor(conn, query_config, sql, params, temp_filename, filepath):
+    """커서로 행을 가져와 csv.writer로 기록 (stream / buffered 모드)"""
+    extract_mode = query_config.get("extract_mode", DEFAULT_EXTRACT_MODE)
+    if extract_mode == "stream":
+        # 서버 사이드 커서: 결과를 itersize 단위로 나눠 받아 메모리 사용량을 일정하게 유지
+        cursor = conn.cursor(name=f"extract_{os.path.splitext(temp_filename)[0]}")
+        cursor.itersize = query_config.get("itersize", DEFAULT_ITERSIZE)
+    else:
+        cursor = conn.cursor()
+    cursor.execute(sql, params)
+
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        # named 커서는 첫 fetch 이후에야 description이 채워지므로 첫 행을 먼저 가져옴
+        rows = iter(cursor)
+        first_row = next(rows, None)
+        if cursor.description:
+            headers = [desc[0] for desc in cursor.description]
+            writer.writerow(headers)
+        convert = [(i, CURSOR_CSV_CONVERTERS[PG_TYPE_KINDS[desc[1]]])
+                   for i, desc in enumerate(cursor.description or [])
+                   if PG_TYPE_KINDS.get(desc[1]) in CURSOR_CSV_CONVERTERS]
+        if convert:
+            def to_csv(row):
+                row = list(row)
+                for i, func in convert:
+                    row[i] = func(row[i])
+                return row
+            rows = map(to_csv, rows)
+            first_row = None if first_row is None else to_csv(first_row)
+        row_count = 0
+        if first_row is not None:
+            writer.writerow(first_row)
+            row_count = 1
+            for row in rows:
+                writer.writerow(row)
+                row_count += 1
+
+    columns = _description_columns(cursor.description)
+    cursor.close()
+    return columns, row_count
+
+def _write_csv_with_copy(conn, sql, params, filepath):
+    """COPY ... TO STDOUT으로 서버가 만든 CSV를 그대로 파일에 기록 (copy 모드)
+
+    파이썬 객체 변환 없이 바이트를 그대로 받으므로 CPU 사용량이 훨씬 적다.
+    헤더/컬럼 순서는 cursor 모드와 같고, 값은 Postgres 텍스트 표현을 따른다
+    (불리언 't'/'f', 배열 '{1,2,3}', NULL은 빈 값).
+    """
+    conn.set_client_encoding('UTF8')
+    cursor = conn.cursor()
+    if params:
+        sql = cursor.mogrify(sql, params).decode('utf-8')
+    sql = sql.strip().rstrip(';')
+
+    # COPY는 컬럼 타입을 알려주지 않으므로 LIMIT 0으로 description만 얻음
+    cursor.execute(f"SELECT * FROM ({sql}) AS src LIMIT 0")
+    columns = _description_columns(cursor.description)
+
+    copy_sql = f"COPY ({sql}) TO STDOUT WITH CSV HEADER"
+    with open(filepath, 'wb') as f:
+        cursor.copy_expert(copy_sql, f, size=COPY_BUFFER_SIZE)
+    row_count = cursor.rowcount  # COPY 명령이 보고한 행 수
+    cursor.close()
+    return columns, row_count
+
+def _write_csv_partitions(query_config, queries, temp_filename, filepath):
+    """파티션별로 연결을 따로 열어 shard CSV를 동시에 만든 뒤 하나로 이어 붙임 (헤더는 한 번만)"""
+    shard_paths = [f"{filepath}.part{index}" for index in range(len(queries))]
+
+    def extract(shard_path, sql, params):
+        conn = _connect_source()
+        try:
+            if query_config.get("extract_mode", DEFAULT_EXTRACT_MODE) == "copy":
+                return _write_csv_with_copy(conn, sql, params, shard_path)
+            return _write_csv_with_cursor(conn, query_config, sql, params, temp_filename, shard_path)
+        finally:
+            conn.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            futures = [executor.submit(extract, shard_path, sql, params)
+                       for shard_path, (sql, params) in zip(shard_paths, queries)]
+            results = [future.result() for future in futures]
+        row_count = 0
+        with open(filepath, 'wb') as out:
+            for index, (shard_path, (_, shard_rows)) in enumerate(zip(shard_paths, results)):
+                with open(shard_path, 'rb') as shard:
+                    if index:
+                        shard.readline()  # 헤더
+                    shutil.copyfileobj(shard, out, COPY_BUFFER_SIZE)
+                row_count += max(shard_rows, 0)
+        return results[0][0], row_count
+    finally:
+        for shard_path in shard_paths:
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+
+def extract_db_to_csv(query_config, temp_filename, watermark=None, table_name=None):
+    """외부 DB에서 쿼리를 실행하고 CSV 파일로 저장 (watermark가 있으면 그 이후 행만)"""
     if not DB_PASSWORD:
         raise ValueError("DB_PASSWORD 환경 변수가 설정되지 않았습니다.")
 
-    print(f"\n--- [1단계] {temp_filename} 추출 시작 ---")
+    log(f"\n--- [1단계] {temp_filename} 추출 시작 ---")
+    metrics = get_metrics(table_name or temp_filename)
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST, database=DB_NAME, user=DB_USER, 
-            password=DB_PASSWORD, port=DB_PORT
-        )
-        cursor = conn.cursor()
-        cursor.execute(query_config['sql'])
-        
+        started = perf_counter()
+        conn = _connect_source()
+        os.makedirs(TEMP_DIR, exist_ok=True)
         filepath = os.path.join(TEMP_DIR, temp_filename)
-        
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if cursor.description:
-                headers = [desc[0] for desc in cursor.description]
-                writer.writerow(headers)
-            writer.writerows(cursor)
-            
-        cursor.close()
+        queries = _partition_queries(conn, query_config, watermark)
+        sql, params = queries[0]
+
+        if len(queries) > 1:
+            _note_partitions(metrics, query_config, len(queries))
+            columns, row_count = _write_csv_partitions(query_config, queries, temp_filename, filepath)
+        elif query_config.get("extract_mode", DEFAULT_EXTRACT_MODE) == "copy":
+            columns, row_count = _write_csv_with_copy(conn, sql, params, filepath)
+        else:
+            columns, row_count = _write_csv_with_cursor(conn, query_config, sql, params, temp_filename, filepath)
+        metrics.add_time("extract", perf_counter() - started)
+        metrics.incr("rows_extracted", max(row_count, 0))
+        metrics.incr("csv_bytes", os.path.getsize(filepath))
+
+        # 업로드 시 타입 변환에 쓸 컬럼 타입 정보
+        with open(_columns_path(filepath), 'w', encoding='utf-8') as f:
+            json.dump(columns, f)
+
         conn.close()
-        print(f"✅ 데이터 추출 완료: {filepath}")
+        log(f"✅ 데이터 추출 완료: {filepath}")
         return filepath
     except Exception as e:
-        print(f"❌ DB 추출 실패: {e}")
+        log(f"❌ DB 추출 실패: {e}")
         return None
 
-def _send_batch(data, table_name, on_conflict_col):
-    """Supabase API로 배치 데이터를 Upsert 전송"""
-    headers = {
+def iter_db_rows(table_name, query_config, watermark=None, debug_csv_path=None, serializer=None):
+    """쿼리 결과를 서버 사이드 커서로 itersize씩 읽어 dict로 하나씩 반환 (stream 파이프라인)
+
+    임시 파일 없이 업로드 배치로 바로 이어지므로 추출이 끝나기 전에 업로드가 시작된다.
+    partition 설정이 있으면 구간마다 연결을 따로 열어 동시에 읽고, 도착한 순서대로 섞어 반환한다.
+    debug_csv_path가 주어지면 읽은 행을 CSV로도 기록한다 (디버깅용 사본).
+    serializer가 주어지면 첫 fetch 후 컬럼 타입 정보를 넘겨준다.
+    """
+    if not DB_PASSWORD:
+        raise ValueError("DB_PASSWORD 환경 변수가 설정되지 않았습니다.")
+
+    metrics = get_metrics(table_name)
+    started = perf_counter()
+    row_count = 0
+    conn = _connect_source()
+    debug_file = None
+    itersize = query_config.get("itersize", DEFAULT_ITERSIZE)
+    chunks = None
+
+    def fetch(fetch_conn, sql, params):
+        """(description, 행 목록)을 itersize 단위로 반환"""
+        cursor = fetch_conn.cursor(name=f"stream_{table_name}")
+        cursor.itersize = itersize
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows:
+                break
+            yield cursor.description, rows
+        cursor.close()
+
+    def produce(fetch_conn, sql, params, emit):
+        for chunk in fetch(fetch_conn, sql, params):
+            emit(chunk)
+
+    try:
+        queries = _partition_queries(conn, query_config, watermark)
+        if len(queries) > 1:
+            _note_partitions(metrics, query_config, len(queries))
+            chunks = _iter_partition_chunks(queries, produce)
+        else:
+            chunks = fetch(conn, *queries[0])
+
+        headers = writer = None
+        for description, rows in chunks:
+            if headers is None:
+                headers = [desc[0] for desc in description]
+                if serializer:
+                    serializer.set_columns(_description_columns(description))
+                if debug_csv_path:
+                    debug_file = open(debug_csv_path, 'w', newline='', encoding='utf-8')
+                    writer = csv.writer(debug_file)
+                    writer.writerow(headers)
+            for values in rows:
+                if writer:
+                    writer.writerow(values)
+                row_count += 1
+                yield dict(zip(headers, values))
+
+        log(f"✅ 데이터 스트리밍 추출 완료")
+    except Exception as e:
+        log(f"❌ DB 추출 실패: {e}")
+        raise
+    finally:
+        # 업로드와 겹쳐 진행되므로 extract 시간은 스트림이 열려 있던 전체 시간이다
+        metrics.add_time("extract", perf_counter() - started)
+        metrics.incr("rows_extracted", row_count)
+        if debug_file:
+            debug_file.close()
+            log(f"📝 디버그용 CSV 사본: {debug_csv_path}")
+        if chunks is not None:
+            chunks.close()  # 소비가 중간에 끝났으면 파티션 추출 스레드도 정리
+        conn.close()
+
+# --- 직접 적재 (loader: "direct" / "swap") ---
+def _loader(config):
+    """테이블 설정의 적재 방식 ("direct"/"swap"인데 SUPABASE_DB_URL이 없으면 "rest")"""
+    loader = config.get("loader", DEFAULT_LOADER)
+    if loader in ("direct", "swap") and not SUPABASE_DB_URL:
+        log("ℹ️ SUPABASE_DB_URL이 없어 REST API로 업로드합니다.")
+        return "rest"
+    return loader
+
+class _LockedWriter:
+    """여러 COPY TO 스레드가 한 파이프에 쓸 때 행이 섞이지 않게 write마다 잠금
+
+    psycopg2 copy_expert는 COPY 데이터 메시지(행 하나)마다 write를 호출하므로 행 단위로 이어진다.
+    """
+
+    def __init__(self, writer, lock):
+        self._writer = writer
+        self._lock = lock
+
+    def write(self, data):
+        with self._lock:
+            return self._writer.write(data)
+
+def _pipe_copy(source_conn, copy_out_sqls, target_cursor, copy_in_sql):
+    """소스의 COPY TO STDOUT 출력을 OS 파이프로 대상 COPY FROM STDIN에 흘려보내고 행 수 반환
+
+    소스 쪽은 별도 스레드에서 파이프에 쓰므로 추출과 적재가 동시에 진행되고, 메모리에는
+    파이프 버퍼만큼만 올라간다. copy_out_sqls가 여러 개(파티션)면 첫 쿼리는 source_conn,
+    나머지는 새 연결에서 동시에 실행해 같은 파이프에 행 단위로 섞어 쓴다. 소스 쪽이 실패하면
+    나머지 쿼리를 취소하고 예외를 다시 올린다 (대상 쪽은 EOF까지만 받았으므로 호출한 쪽에서
+    롤백해야 함).
+    """
+    read_fd, write_fd = os.pipe()
+    writer = os.fdopen(write_fd, 'wb')
+    shared_writer = _LockedWriter(writer, threading.Lock())
+    conns = [source_conn]
+    rows = []
+    errors = []
+
+    def produce(copy_out_sql, index):
+        conn = source_conn
+        try:
+            if index:
+                conn = _connect_source()
+                conn.set_client_encoding('UTF8')
+                conns.append(conn)
+            cursor = conn.cursor()
+            cursor.copy_expert(copy_out_sql, shared_writer, size=COPY_BUFFER_SIZE)
+            rows.append(cursor.rowcount)
+        except Exception as e:
+            errors.append(e)
+            for other in conns:
+                if other is not conn:
+                    try:
+                        other.cancel()
+                    except psycopg2.Error:
+                        pass
+        finally:
+            if conn is not source_conn:
+                conn.close()
+
+    def produce_all():
+        try:
+            threads = [threading.Thread(target=produce, args=(copy_out_sql, index), daemon=True)
+                       for index, copy_out_sql in enumerate(copy_out_sqls)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            try:
+                writer.close()
+            except OSError:
+                pass  # 대상 쪽이 먼저 끝나 파이프가 닫힌 경우
+
+    producer = threading.Thread(target=produce_all, daemon=True)
+    producer.start()
+    try:
+        with os.fdopen(read_fd, 'rb') as reader:
+            target_cursor.copy_expert(copy_in_sql, reader, size=COPY_BUFFER_SIZE)
+    finally:
+        producer.join()
+    if errors:
+        raise errors[0]
+    return sum(rows)
+
+def _source_copy_query(source_conn, config, watermark=None):
+    """COPY (...) TO STDOUT에 넣을 소스 쿼리 목록(파티션별, 파라미터 바인딩 완료)과 결과 컬럼 이름 목록 반환"""
+    queries = []
+    with source_conn.cursor() as cursor:
+        for query, params in _partition_queries(source_conn, config, watermark):
+            if params:
+                query = cursor.mogrify(query, params).decode('utf-8')
+            queries.append(query.strip().rstrip(';'))
+        cursor.execute(f"SELECT * FROM ({queries[0]}) AS src LIMIT 0")
+        return queries, [desc[0] for desc in cursor.description]
+
+def load_direct(table_name, config, watermark=None, prune=True, watermark_column=None):
+    """REST API 없이 Supabase Postgres에 직접 적재하고 (성공 여부, watermark_column 최댓값) 반환
+
+    소스 COPY TO STDOUT을 대상 임시 테이블의 COPY FROM STDIN으로 바로 흘려보낸 뒤
+    INSERT ... ON CONFLICT DO UPDATE(값이 바뀐 행만)로 upsert하고, prune이면 임시 테이블에
+    없는 키를 DELETE ... WHERE NOT EXISTS로 지운다. 모두 한 트랜잭션이라 실패하면 대상은
+    그대로다. dry-run이면 임시 테이블 COPY까지만 하고 대상 테이블에는 쓰지 않은 채 롤백한다
+    (행 잠금/트리거 없음). 대상 테이블 컬럼 이름은 소스 쿼리 결과와 같아야 한다.
+    """
+    prune = prune and bool(config.get("key_columns"))
+    log(f"\n--- [1~3단계] {table_name} 직접 적재 시작 "
+        f"(COPY → upsert{' → orphan 삭제' if prune else ''}{', dry-run' if DRY_RUN else ''}) ---")
+    metrics = get_metrics(table_name)
+    source = target = None
+    try:
+        source = _connect_source()
+        source.set_client_encoding('UTF8')
+        queries, columns = _source_copy_query(source, config, watermark)
+
+        target = _connect_target()
+        target.set_client_encoding('UTF8')
+        cursor = target.cursor()
+        table = pgsql.Identifier(table_name)
+        staging = pgsql.Identifier(f"_sync_{table_name}")
+        column_list = pgsql.SQL(", ").join(map(pgsql.Identifier, columns))
+        cursor.execute(pgsql.SQL("SET LOCAL statement_timeout = {}").format(pgsql.Literal(DIRECT_STATEMENT_TIMEOUT)))
+        cursor.execute(pgsql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP")
+                       .format(staging, table))
+
+        # 1. 소스 → 임시 테이블 (추출과 적재가 파이프로 겹침, 파티션이 있으면 구간별 COPY를 동시에)
+        if len(queries) > 1:
+            _note_partitions(metrics, config, len(queries))
+        with metrics.timer("extract"):
+            copied = _pipe_copy(
+                source, [f"COPY ({query}) TO STDOUT WITH (FORMAT csv)" for query in queries], cursor,
+                pgsql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(staging, column_list).as_string(target))
+        metrics.incr("rows_extracted", copied)
+        log(f"📥 {copied}개 행을 대상 임시 테이블로 복사")
+
+        max_value = None
+        if watermark_column:
+            cursor.execute(pgsql.SQL("SELECT max({})::text FROM {}").format(pgsql.Identifier(watermark_column), staging))
+            max_value = cursor.fetchone()[0]
+
+        if DRY_RUN:
+            target.rollback()
+            log("🧪 dry-run: 임시 테이블 복사까지만 확인하고 롤백 (upsert/orphan 삭제 생략)")
+            return True, max_value
+
+        cursor.execute(pgsql.SQL("ANALYZE {}").format(staging))
+
+        # 2. upsert (값이 같은 행은 건드리지 않아 불필요한 행 버전/WAL을 만들지 않음)
+        conflict_columns = [col.strip() for col in config.get("on_conflict", "").split(",") if col.strip()]
+        update_columns = [col for col in columns if col not in conflict_columns]
+        upsert = pgsql.SQL("INSERT INTO {} AS t ({}) SELECT {} FROM {}").format(
+            table, column_list, column_list, staging)
+        if conflict_columns and update_columns:
+            upsert += pgsql.SQL(" ON CONFLICT ({}) DO UPDATE SET ({}) = ROW({}) WHERE ({}) IS DISTINCT FROM ({})").format(
+                pgsql.SQL(", ").join(map(pgsql.Identifier, conflict_columns)),
+                pgsql.SQL(", ").join(map(pgsql.Identifier, update_columns)),
+                pgsql.SQL(", ").join(pgsql.SQL("EXCLUDED.{}").format(pgsql.Identifier(c)) for c in update_columns),
+                pgsql.SQL(", ").join(pgsql.SQL("t.{}").format(pgsql.Identifier(c)) for c in update_columns),
+                pgsql.SQL(", ").join(pgsql.SQL("EXCLUDED.{}").format(pgsql.Identifier(c)) for c in update_columns))
+        elif conflict_columns:
+            upsert += pgsql.SQL(" ON CONFLICT ({}) DO NOTHING").format(
+                pgsql.SQL(", ").join(map(pgsql.Identifier, conflict_columns)))
+        with metrics.timer("upload"):
+            cursor.execute(upsert)
+        metrics.incr("rows_uploaded", cursor.rowcount)
+        log(f"✅ {cursor.rowcount}개 행 추가/변경 ({copied - cursor.rowcount}개는 변경 없음)")
+
+        # 3. orphan 삭제
+        if prune:
+            match = pgsql.SQL(" AND ").join(
+                pgsql.SQL("s.{0} = t.{0}").format(pgsql.Identifier(col)) for col in config["key_columns"])
+            with metrics.timer("prune"):
+                cursor.execute(pgsql.SQL("DELETE FROM {} AS t WHERE NOT EXISTS (SELECT 1 FROM {} AS s WHERE {})")
+                               .format(table, staging, match))
+            metrics.incr("orphans_found", cursor.rowcount)
+            metrics.incr("orphans_deleted", cursor.rowcount)
+            log(f"🗑️  {cursor.rowcount}개 orphan 레코드 삭제" if cursor.rowcount else "✅ 삭제할 orphan 레코드 없음")
+
+        target.commit()
+        log(f"✅ {table_name} 직접 적재 커밋 완료")
+        return True, max_value
+
+    except Exception as e:
+        log(f"❌ {table_name} 직접 적재 중 오류 (롤백됨): {e}")
+        return False, None
+    finally:
+        if target:
+            target.close()
+        if source:
+            source.close()
+
+def _index_names(cursor, table_name):
+    """테이블 인덱스를 {(primary, unique, USING 이후 정의): 이름} dict로 반환 (이름만 다른 인덱스 대응용)"""
+    cursor.execute("""
+        SELECT c.relname, i.indisprimary, i.indisunique, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+    """, (table_name,))
+    return {(primary, unique, definition.split(" USING ", 1)[1]): name
+            for name, primary, unique, definition in cursor.fetchall()}
+
+def _swap_blockers(cursor, table_name):
+    """LIKE ... INCLUDING ALL로 옮겨지지 않아 교체하면 사라지거나 DROP이 막히는 객체 목록
+
+    트리거, 외래 키(나가는/들어오는), 게시(publication, Supabase Realtime) 등록은 새 테이블에
+    없고, identity 컬럼은 새 시퀀스가 1부터 시작하며, nextval 기본값은 기존 테이블 소유 시퀀스를 가리킨다.
+    """
+    cursor.execute("""
+        SELECT '트리거 ' || tgname FROM pg_trigger
+        WHERE tgrelid = %(table)s::regclass AND NOT tgisinternal
+        UNION ALL
+        SELECT '외래 키 ' || conname FROM pg_constraint
+        WHERE contype = 'f' AND (conrelid = %(table)s::regclass OR confrelid = %(table)s::regclass)
+        UNION ALL
+        SELECT '게시 ' || p.pubname FROM pg_publication_rel r JOIN pg_publication p ON p.oid = r.prpubid
+        WHERE r.prrelid = %(table)s::regclass
+        UNION ALL
+        SELECT 'identity 컬럼 ' || attname FROM pg_attribute
+        WHERE attrelid = %(table)s::regclass AND attidentity <> '' AND NOT attisdropped
+        UNION ALL
+        SELECT '시퀀스 기본값 ' || a.attname FROM pg_attrdef d
+        JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+        WHERE d.adrelid = %(table)s::regclass AND pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval(%%'
+    """, {"table": table_name})
+    return [row[0] for row in cursor.fetchall()]
+
+def _copy_privileges(cursor, table_name, shadow_name):
+    """table_name의 권한(GRANT), RLS 설정, 정책을 shadow_name에 그대로 복사
+
+    새 테이블에는 기본 권한(ALTER DEFAULT PRIVILEGES)이 붙어 있으므로 먼저 모두 회수한 뒤
+    기존 테이블의 권한만 다시 부여한다. 컬럼 단위 권한은 복사하지 않는다.
+    """
+    shadow = pgsql.Identifier(shadow_name)
+
+    def role(name):
+        return pgsql.SQL("PUBLIC") if name == "public" else pgsql.Identifier(name)
+
+    acl_sql = """
+        SELECT CASE WHEN a.grantee = 0 THEN 'public' ELSE pg_get_userbyid(a.grantee) END, a.privilege_type
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = %s::regclass AND a.grantee <> c.relowner
+    """
+    cursor.execute(acl_sql, (shadow_name,))
+    for grantee in {grantee for grantee, _ in cursor.fetchall()}:
+        cursor.execute(pgsql.SQL("REVOKE ALL ON {} FROM {}").format(shadow, role(grantee)))
+    cursor.execute(acl_sql, (table_name,))
+    for grantee, privilege in cursor.fetchall():
+        cursor.execute(pgsql.SQL("GRANT {} ON {} TO {}").format(pgsql.SQL(privilege), shadow, role(grantee)))
+
+    cursor.execute("SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = %s::regclass",
+                   (table_name,))
+    row_security, force_row_security = cursor.fetchone()
+    if row_security:
+        cursor.execute(pgsql.SQL("ALTER TABLE {} ENABLE ROW LEVEL SECURITY").format(shadow))
+    if force_row_security:
+        cursor.execute(pgsql.SQL("ALTER TABLE {} FORCE ROW LEVEL SECURITY").format(shadow))
+    cursor.execute("""
+        SELECT policyname, permissive, cmd, roles, qual, with_check FROM pg_policies
+        WHERE schemaname = current_schema() AND tablename = %s
+    """, (table_name,))
+    for name, permissive, cmd, roles, qual, with_check in cursor.fetchall():
+        policy = pgsql.SQL("CREATE POLICY {} ON {} AS {} FOR {} TO {}").format(
+            pgsql.Identifier(name), shadow, pgsql.SQL(permissive), pgsql.SQL(cmd),
+            pgsql.SQL(", ").join(map(role, roles)))
+        if qual:
+            policy += pgsql.SQL(" USING ({})").format(pgsql.SQL(qual))
+        if with_check:
+            policy += pgsql.SQL(" WITH CHECK ({})").format(pgsql.SQL(with_check))
+        cursor.execute(policy)
+
+def load_swap(table_name, config, watermark_column=None):
+    """새 테이블에 전체 결과를 적재한 뒤 기존 테이블과 바꿔치기하고 (성공 여부, watermark_column 최댓값) 반환
+
+    같은 구조(LIKE ... INCLUDING ALL)의 섀도 테이블을 만들어 권한/RLS 정책을 복사하고, 소스
+    COPY TO STDOUT을 그대로 COPY FROM STDIN으로 채운 뒤 한 트랜잭션 안에서 이름을 바꾸고
+    기존 테이블을 지운다. 읽는 쪽은 커밋 순간 이전 스냅샷에서 새 스냅샷으로 바로 넘어가며,
+    upsert와 orphan 비교가 필요 없다. 인덱스 이름은 기존 이름으로 되돌리고, 커밋 후
+    PostgREST가 스키마 캐시를 다시 읽도록 NOTIFY pgrst를 보낸다.
+    트리거, 외래 키, 게시(Realtime) 등록, identity/시퀀스 기본값은 옮기지 않으므로
+    (_swap_blockers) 이런 것이 있는 테이블은 교체하지 않고 load_direct로 적재한다. 의존 뷰가
+    있으면 DROP 단계에서 실패해 롤백된다. 바꿔치기 잠금은 SWAP_LOCK_TIMEOUT까지만 기다린다.
+    dry-run이면 섀도 테이블 COPY/ANALYZE까지만 하고 이름 교체 없이 롤백한다 (기존 테이블 잠금 없음).
+    """
+    log(f"\n--- [1~3단계] {table_name} 교체 적재 시작 (섀도 테이블 COPY → 이름 교체"
+        f"{', dry-run' if DRY_RUN else ''}) ---")
+    metrics = get_metrics(table_name)
+    shadow_name = f"_sync_swap_{table_name}"
+    old_name = f"_sync_old_{table_name}"
+    table, shadow, old = map(pgsql.Identifier, (table_name, shadow_name, old_name))
+    source = target = None
+    try:
+        target = _connect_target()
+        target.set_client_encoding('UTF8')
+        cursor = target.cursor()
+        blockers = _swap_blockers(cursor, table_name)
+        if blockers:
+            log(f"ℹ️ 교체하면 사라지는 객체가 있어 direct로 적재합니다: {', '.join(blockers)}")
+            target.close()
+            target = None
+            return load_direct(table_name, config, prune=bool(config.get("delete_orphans")),
+                               watermark_column=watermark_column)
+
+        source = _connect_source()
+        source.set_client_encoding('UTF8')
+        queries, columns = _source_copy_query(source, config)
+        cursor.execute(pgsql.SQL("SET LOCAL statement_timeout = {}").format(pgsql.Literal(DIRECT_STATEMENT_TIMEOUT)))
+        index_names = _index_names(cursor, table_name)
+        cursor.execute(pgsql.SQL("CREATE TABLE {} (LIKE {} INCLUDING ALL)").format(shadow, table))
+        _copy_privileges(cursor, table_name, shadow_name)
+
+        # 1. 소스 → 섀도 테이블 (인덱스는 이미 있으므로 COPY 중에 함께 갱신됨)
+        if len(queries) > 1:
+            _note_partitions(metrics, config, len(queries))
+        column_list = pgsql.SQL(", ").join(map(pgsql.Identifier, columns))
+        with metrics.timer("extract"):
+            copied = _pipe_copy(
+                source, [f"COPY ({query}) TO STDOUT WITH (FORMAT csv)" for query in queries], cursor,
+                pgsql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(shadow, column_list).as_string(target))
+        metrics.incr("rows_extracted", copied)
+        log(f"📥 {copied}개 행을 섀도 테이블 {shadow_name}로 복사")
+        cursor.execute(pgsql.SQL("ANALYZE {}").format(shadow))
+        max_value = None
+        if watermark_column:
+            cursor.execute(pgsql.SQL("SELECT max({})::text FROM {}").format(pgsql.Identifier(watermark_column), shadow))
+            max_value = cursor.fetchone()[0]
+
+        if DRY_RUN:
+            target.rollback()
+            log("🧪 dry-run: 섀도 테이블 복사까지만 확인하고 롤백 (이름 교체/DROP/NOTIFY 생략)")
+            return True, max_value
+
+        # 2. 이름 교체 (ACCESS EXCLUSIVE 잠금은 여기서부터 커밋까지만 잡힘)
+        with metrics.timer("swap"):
+            cursor.execute(pgsql.SQL("SET LOCAL lock_timeout = {}").format(pgsql.Literal(SWAP_LOCK_TIMEOUT)))
+            cursor.execute(pgsql.SQL("ALTER TABLE {} RENAME TO {}").format(table, old))
+            cursor.execute(pgsql.SQL("ALTER TABLE {} RENAME TO {}").format(shadow, table))
+            cursor.execute(pgsql.SQL("DROP TABLE {}").format(old))
+            for key, name in _index_names(cursor, table_name).items():
+                if key in index_names and index_names[key] != name:
+                    cursor.execute(pgsql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                        pgsql.Identifier(name), pgsql.Identifier(index_names[key])))
+            cursor.execute("NOTIFY pgrst, 'reload schema'")
+        metrics.incr("rows_uploaded", copied)
+
+        target.commit()
+        log(f"✅ {table_name} 테이블 교체 완료 ({copied}개 행)")
+        return True, max_value
+
+    except Exception as e:
+        log(f"❌ {table_name} 교체 적재 중 오류 (롤백됨, 기존 테이블 유지): {e}")
+        return False, None
+    finally:
+        if target:
+            target.close()
+        if source:
+            source.close()
+
+# --- Supabase HTTP 클라이언트 ---
+_session = None
+_session_lock = threading.Lock()
+
+def _auth_headers():
+    """모든 Supabase 요청에 붙는 인증/본문 헤더"""
+    return {
         "apikey": SUPABASE_KEY,
         "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates"  # upsert 동작 명시
+        "Content-Type": "application/json"
     }
+
+def get_supabase_session():
+    """모든 Supabase 호출이 공유하는 requests.Session 반환
+
+    커넥션 풀(HTTPAdapter)과 keep-alive로 배치/삭제 요청마다 TCP+TLS 핸드셰이크를
+    반복하지 않는다. 인증 헤더는 생성 시 한 번만 설정한다.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(_auth_headers())
+                _session = session
+    return _session
+
+def _table_url(table_name):
+    """PostgREST 테이블 엔드포인트 URL"""
+    return f"{SUPABASE_URL}/rest/v1/{table_name}"
+
+# --- 배치 크기 조절 ---
+class AdaptiveBatcher:
+    """바이트 예산과 목표 응답 시간에 맞춰 다음 배치의 행 수를 정함
+
+    성공한 요청마다 (행 수, 본문 크기, 응답 시간)을 받아, 응답이 목표의 절반보다 빠르면
+    그 배치 행 수의 1.5배까지 키우고 목표보다 느리면 비율만큼 줄인다. 현재 크기가 아니라
+    실제로 보낸 행 수를 기준으로 하므로 반으로 나눈 배치나 동시에 끝난 배치가 겹쳐 커지지 않는다.
+    행당 평균 크기로 구한 max_bytes 한도는 항상 지키며, 413을 받으면 거부된 본문 크기보다
+    작게 max_bytes를 낮춰 이후에도 유지한다. 413이나 타임아웃이 나면 보낸 행 수의 절반으로 줄인다.
+    여러 업로드 스레드가 함께 쓰므로 갱신은 lock으로 보호한다.
+    """
+
+    def __init__(self, initial_size=BATCH_SIZE, max_bytes=BATCH_MAX_BYTES,
+                 target_latency=BATCH_TARGET_LATENCY, min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE):
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = self._clamp(initial_size)
+        self._lock = threading.Lock()
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(self.max_size, size)))
+
+    def record(self, rows, payload_bytes, latency):
+        if not rows:
+            return
+        with self._lock:
+            size = self.size
+            if latency < self.target_latency / 2:
+                size = max(size, rows * 1.5)
+            elif latency > self.target_latency:
+                size = min(size, rows * self.target_latency / latency)
+            bytes_per_row = max(1, payload_bytes / rows)
+            self.size = self._clamp(min(size, self.max_bytes / bytes_per_row))
+
+    def shrink(self, rows, payload_bytes=None):
+        """413(payload_bytes는 거부된 본문의 압축 전 크기)이나 타임아웃 후 호출"""
+        with self._lock:
+            size = min(self.size, rows // 2)
+            if payload_bytes:
+                self.max_bytes = min(self.max_bytes, payload_bytes * BATCH_413_BYTES_RATIO)
+                size = min(size, self.max_bytes / max(1, payload_bytes / rows))
+            self.size = self._clamp(size)
+
+def _make_batcher(config):
+    """테이블 설정에 맞는 AdaptiveBatcher (adaptive_batching이 꺼져 있으면 None)"""
+    if not config.get("adaptive_batching", ADAPTIVE_BATCHING):
+        return None
+    return AdaptiveBatcher(
+        initial_size=config.get("batch_size", BATCH_SIZE),
+        max_bytes=config.get("batch_max_bytes", BATCH_MAX_BYTES),
+        target_latency=config.get("batch_target_latency", BATCH_TARGET_LATENCY)
+    )
+
+def _backoff_delay(attempt):
+    """full jitter 지수 백오프: 0 ~ min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^attempt) 초"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+def _retry_after(response):
+    """429/503 응답의 Retry-After(초) 값 (없거나 날짜 형식이면 None)"""
+    value = response.headers.get("Retry-After")
+    try:
+        return min(float(value), RETRY_MAX_DELAY * 2) if value else None
+    except ValueError:
+        return None
+
+def _retry_delay(table_name, attempt, response=None, error=None):
+    """요청 한 번의 결과(응답 또는 연결 오류)로 재시도 대기 시간(초)을 정함 (재시도하지 않으면 None)
+
+    연결 오류와 429/5xx는 Retry-After 또는 지터를 준 지수 백오프만큼 기다린다.
+    마지막 시도였다면 None을 반환해 호출자가 응답을 돌려주거나 오류를 올리게 한다.
+    """
+    if attempt == RETRY_MAX_ATTEMPTS - 1:
+        return None
+    if error is not None:
+        delay = _backoff_delay(attempt)
+        reason = f"연결 오류 ({error.__class__.__name__})"
+    elif response.status_code in RETRY_STATUS_CODES:
+        delay = _retry_after(response) or _backoff_delay(attempt)
+        reason = f"Code {response.status_code}"
+    else:
+        return None
+    log(f"🔁 {table_name} {reason}, {delay:.1f}초 후 재시도 ({attempt + 1}/{RETRY_MAX_ATTEMPTS - 1})")
+    get_metrics(table_name).incr("retries")
+    return delay
+
+def _post_with_retry(table_name, body, headers, params):
+    """배치 POST 요청, 일시적 오류는 재시도 후 (응답, 마지막 요청 소요 시간) 반환
+
+    재시도 여부와 대기 시간은 _retry_delay가 정한다. 읽기 타임아웃은 배치가 너무 큰
+    신호로 보고 재시도 없이 응답 None을 반환한다. 재시도를 모두 소진하면 마지막 응답을
+    반환하거나 연결 오류를 그대로 올린다.
+    """
+    session = get_supabase_session()
+    metrics = get_metrics(table_name)
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        started = perf_counter()
+        metrics.incr("upsert_requests")
+        metrics.incr("bytes_sent", len(body))
+        try:
+            response = session.post(_table_url(table_name), headers=headers,
+                                    params=params, data=body, timeout=HTTP_TIMEOUT)
+            metrics.observe_latency("upsert", perf_counter() - started)
+        except requests.exceptions.ConnectionError as e:
+            # ConnectTimeout도 여기서 잡혀 재시도된다
+            delay = _retry_delay(table_name, attempt, error=e)
+            if delay is None:
+                raise
+        except requests.exceptions.Timeout:
+            return None, perf_counter() - started
+        else:
+            delay = _retry_delay(table_name, attempt, response)
+            if delay is None:
+                return response, perf_counter() - started
+        sleep(delay)
+
+def _encode_batch(data, table_name, gzip_level=0):
+    """배치를 요청 본문으로 인코딩하고 (본문, 압축 전 bytes, 헤더) 반환"""
+    metrics = get_metrics(table_name)
+    started = perf_counter()
+    body = encode_json(data)
+    raw_bytes = len(body)
+    headers = UPSERT_HEADERS
+    if gzip_level:
+        body = gzip.compress(body, compresslevel=gzip_level)
+        headers = GZIP_UPSERT_HEADERS
+    metrics.add_time("encode", perf_counter() - started)
+    metrics.incr("batches_encoded")
+    metrics.incr("payload_bytes", raw_bytes)
+    metrics.incr("payload_bytes_compressed", len(body))
+    return body, raw_bytes, headers
+
+def _batch_result(data, table_name, raw_bytes, response, latency, batcher=None, rejected=None):
+    """배치 전송 응답을 판정해 (성공 여부, 반씩 나눠 재전송할 사유) 반환
+
+    본문이 너무 크거나(413) 타임아웃(응답 None)이면 배치를 반으로 나눠 다시 보내도록
+    사유를 돌려준다 (upsert라 재전송해도 안전). 400/409/422 같은 데이터 오류는 배치를
+    계속 반으로 나눠 문제 행만 골라내고, rejected 리스트가 주어지면 거기에 모은다.
+    batcher가 있으면 결과를 알려 다음 배치 크기를 조절한다. 사유가 None이 아니면 성공
+    여부 대신 나눠 보낸 결과를 써야 한다.
+    """
+    if response is None or response.status_code == 413:
+        if batcher:
+            batcher.shrink(len(data), raw_bytes if response is not None else None)
+        reason = "타임아웃" if response is None else "본문 크기 초과(413)"
+        if len(data) <= 1:
+            log(f"⚠️ {table_name} Upsert 실패 ({reason}, 1행 배치)")
+            return False, None
+        return False, reason
     
-    params = {}
-    if on_conflict_col:
-        params['on_conflict'] = on_conflict_col
+    if 200 <= response.status_code < 300:
+        if batcher:
+            batcher.record(len(data), raw_bytes, latency)
+        return True, None
     
-    url = f"{SUPABASE_URL}/rest/v1/{table_name}"
-    response = requests.post(url, headers=headers, params=params, data=json.dumps(data))
+    if response.status_code in BISECT_STATUS_CODES and rejected is not None:
+        if len(data) > 1:
+            return False, f"데이터 오류(Code {response.status_code})"
+        rejected.append(data[0])
+        log(f"🚫 {table_name} 거부된 행 (Code {response.status_code}): "
+            f"{encode_json(data[0])[:300].decode('utf-8', 'replace')} → {response.text[:300]}")
+        if len(rejected) > MAX_REJECTED_ROWS:
+            log(f"❌ {table_name} 거부된 행이 {MAX_REJECTED_ROWS}개를 넘어 업로드를 중단합니다.")
+            return False, None
+        return True, None
     
-    if 200 <= response.status_code < 300:
-        return True
-    else:
-        print(f"⚠️ {table_name} Upsert 실패 (Code {response.status_code}): {response.text}")
-        return False
+    log(f"⚠️ {table_name} Upsert 실패 (Code {response.status_code}): {response.text}")
+    return False, None
 
-def delete_orphaned_records(table_name, key_columns, current_keys):
-    """Supabase에서 소스 DB에 없는 레코드 삭제"""
-    print(f"\n--- [3단계] {table_name}에서 orphan 레코드 삭제 시작 ---")
+def _split_batch(data, table_name, reason):
+    """배치를 반으로 나눈 두 조각 반환 (재전송 로그 출력)"""
+    half = len(data) // 2
+    log(f"↘️  {table_name} {reason}: {len(data)}행 배치를 {half}/{len(data) - half}행으로 나눠 재전송")
+    return data[:half], data[half:]
+
+def _send_batch(data, table_name, on_conflict_col, gzip_level=0, batcher=None, rejected=None):
+    """Supabase API로 배치 데이터를 Upsert 전송 (gzip_level > 0이면 본문을 gzip 압축)
+
+    일시적 오류는 _post_with_retry가 재시도하고, 응답 판정(413/타임아웃 분할, 데이터 오류
+    bisect)은 _batch_result가 한다. 나눠야 하면 두 조각을 차례로 다시 보낸다.
+    """
+    params = {'on_conflict': on_conflict_col} if on_conflict_col else {}
+    body, raw_bytes, headers = _encode_batch(data, table_name, gzip_level)
+    if DRY_RUN:
+        return True
     
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
+    response, latency = _post_with_retry(table_name, body, headers, params)
+    ok, split_reason = _batch_result(data, table_name, raw_bytes, response, latency, batcher, rejected)
+    if split_reason is None:
+        return ok
+    first, second = _split_batch(data, table_name, split_reason)
+    return (_send_batch(first, table_name, on_conflict_col, gzip_level, batcher, rejected)
+            and _send_batch(second, table_name, on_conflict_col, gzip_level, batcher, rejected))
+
+PGRST_RESERVED_CHARS = set(',.:()"\\ ')
+
+def _pgrst_value(value):
+    """PostgREST 필터 값 인코딩 (예약 문자가 있으면 큰따옴표로 감쌈)"""
+    value = str(value)
+    if any(c in PGRST_RESERVED_CHARS for c in value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return value
+
+def _orphan_filter(key_columns, key_tuples):
+    """키 묶음을 DELETE 한 번에 쓸 PostgREST 필터 파라미터로 변환
+
+    단일키: user_id=in.(1,2,3)
+    복합키: 앞 컬럼으로 묶어 or=(and(user_id.eq.1,order_id.in.(10,11)),...)
+    """
+    if len(key_columns) == 1:
+        values = ",".join(_pgrst_value(key[0]) for key in key_tuples)
+        return {key_columns[0]: f"in.({values})"}
+
+    grouped = {}
+    for key in key_tuples:
+        grouped.setdefault(key[:-1], []).append(key[-1])
+
+    clauses = []
+    for prefix, last_values in grouped.items():
+        conditions = [f"{col}.eq.{_pgrst_value(v)}" for col, v in zip(key_columns, prefix)]
+        values = ",".join(_pgrst_value(v) for v in last_values)
+        conditions.append(f"{key_columns[-1]}.in.({values})")
+        clauses.append(f"and({','.join(conditions)})")
+    return {"or": f"({','.join(clauses)})"}
+
+def _fit_delete_url(key_columns, chunk):
+    """인코딩된 DELETE 필터가 DELETE_MAX_URL_BYTES를 넘지 않도록 키 묶음을 반씩 나눠 반환
+
+    복합키는 키마다 and(...) 절이 붙고 괄호/쉼표가 퍼센트 인코딩되므로 키 수만으로는 길이를 알 수 없다.
+    """
+    if len(chunk) > 1 and len(urlencode(_orphan_filter(key_columns, chunk))) > DELETE_MAX_URL_BYTES:
+        half = len(chunk) // 2
+        return _fit_delete_url(key_columns, chunk[:half]) + _fit_delete_url(key_columns, chunk[half:])
+    return [chunk]
+
+def _delete_result(table_name, chunk, status_code, text):
+    """DELETE 응답을 판정해 삭제된 키 수 반환 (414라 반씩 나눠 재시도해야 하면 None)"""
+    if 200 <= status_code < 300:
+        return len(chunk)
+    if status_code == 414 and len(chunk) > 1:
+        half = len(chunk) // 2
+        log(f"↘️  {table_name} URL 길이 초과(414): {len(chunk)}개 키를 {half}/{len(chunk) - half}개로 나눠 재시도")
+        return None
+    log(f"⚠️ 삭제 실패 ({len(chunk)}개 키, Code {status_code}): {text}")
+    return 0
+
+def _delete_chunk(session, table_name, key_columns, chunk):
+    """키 묶음 하나를 DELETE하고 삭제된 키 수 반환 (414면 반씩 나눠 재시도)"""
+    if DRY_RUN:
+        return len(chunk)
+    metrics = get_metrics(table_name)
+    started = perf_counter()
+    response = session.delete(_table_url(table_name), params=_orphan_filter(key_columns, chunk),
+                              timeout=HTTP_TIMEOUT)
+    metrics.observe_latency("delete", perf_counter() - started)
+    metrics.incr("delete_requests")
+
+    deleted = _delete_result(table_name, chunk, response.status_code, response.text)
+    if deleted is not None:
+        return deleted
+    half = len(chunk) // 2
+    return (_delete_chunk(session, table_name, key_columns, chunk[:half])
+            + _delete_chunk(session, table_name, key_columns, chunk[half:]))
+
+def _delete_key_chunks(table_name, key_columns, keys, chunk_size):
+    """orphan 키를 chunk_size 단위(URL 길이 상한 안)로 묶어 삭제하고 삭제된 키 수 반환"""
+    session = get_supabase_session()
+    keys = list(keys)
+    deleted_count = 0
+
+    for start in range(0, len(keys), chunk_size):
+        for chunk in _fit_delete_url(key_columns, keys[start:start + chunk_size]):
+            deleted_count += _delete_chunk(session, table_name, key_columns, chunk)
+
+    return deleted_count
+
+def _keyset_filter(key_columns, last_key):
+    """마지막으로 읽은 키 다음부터 조회하는 keyset 페이지네이션 필터
+
+    단일키: user_id=gt.<last>
+    복합키: or=(user_id.gt.A,and(user_id.eq.A,order_id.gt.B))
+    """
+    if len(key_columns) == 1:
+        return {key_columns[0]: f"gt.{_pgrst_value(last_key[0])}"}
+
+    clauses = []
+    for i, col in enumerate(key_columns):
+        conditions = [f"{c}.eq.{_pgrst_value(v)}" for c, v in zip(key_columns[:i], last_key[:i])]
+        conditions.append(f"{col}.gt.{_pgrst_value(last_key[i])}")
+        clauses.append(conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})")
+    return {"or": f"({','.join(clauses)})"}
+
+def _key_scan_params(key_columns, last_key=None, page_size=None):
+    """키 스캔 한 페이지의 GET 파라미터 (last_key 다음부터 page_size개)"""
+    params = {
+        "select": ",".join(key_columns),
+        "order": ",".join(f"{col}.asc" for col in key_columns),
+        "limit": page_size or KEY_SCAN_PAGE_SIZE
     }
+    if last_key is not None:
+        params.update(_keyset_filter(key_columns, last_key))
+    return params
+
+def _key_scan_page(key_columns, status_code, text, records):
+    """키 스캔 응답을 (키 튜플 페이지, 다음 last_key)로 변환 (빈 페이지면 (None, None))"""
+    if status_code != 200:
+        raise RuntimeError(f"기존 데이터 조회 실패 (Code {status_code}): {text}")
+    if not records:
+        return None, None
+    page = [tuple(str(record[col]) for col in key_columns) for record in records]
+    return page, tuple(records[-1][col] for col in key_columns)
+
+def iter_existing_key_pages(table_name, key_columns, page_size=None):
+    """Supabase 테이블의 키를 keyset 페이지네이션으로 순서대로 페이지(키 튜플 리스트)씩 반환
+
+    PostgREST max-rows 제한과 무관하게 전체 키를 보며, 한 번에 한 페이지만 메모리에 둔다.
+    빈 페이지가 올 때까지 읽으므로 서버 max-rows가 page_size보다 작아도 누락되지 않는다.
+    """
+    session = get_supabase_session()
+    url = _table_url(table_name)
+    metrics = get_metrics(table_name)
+    last_key = None
+
+    while True:
+        started = perf_counter()
+        response = session.get(url, params=_key_scan_params(key_columns, last_key, page_size),
+                               timeout=HTTP_TIMEOUT)
+        metrics.observe_latency("key_scan", perf_counter() - started)
+        metrics.incr("key_scan_requests")
+        records = response.json() if response.status_code == 200 else None
+        page, last_key = _key_scan_page(key_columns, response.status_code, response.text, records)
+        if page is None:
+            return
+        yield page
+
+def delete_orphaned_records(table_name, key_columns, current_keys, chunk_size=None,
+                            engine="thread", concurrency=None):
+    """Supabase에서 소스 DB에 없는 레코드 삭제
+
+    기존 키를 페이지 단위로 스캔하면서 orphan이 chunk_size만큼 모이면 바로 삭제하므로
+    대상 테이블 크기와 관계없이 메모리 사용량이 일정하다. current_keys(KeyIndex)와는 페이지
+    단위로 한 번에 비교한다. engine이 "async"면 스캔과 삭제를 asyncio로 겹쳐 진행한다
+    (동시 DELETE 최대 concurrency개).
+    """
+    log(f"\n--- [3단계] {table_name}에서 orphan 레코드 삭제 시작 ---")
+    
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    metrics = get_metrics(table_name)
+    started = perf_counter()
+    orphan_count = 0
+    deleted_count = 0
     
     try:
-        # 1. Supabase에서 현재 모든 키 조회
-        url = f"{SUPABASE_URL}/rest/v1/{table_name}"
-        select_cols = ",".join(key_columns)
-        params = {"select": select_cols}
-        
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"⚠️ 기존 데이터 조회 실패: {response.text}")
-            return
-        
-        existing_records = response.json()
-        
-        # 2. 삭제할 키 찾기
-        existing_keys = set()
-        for record in existing_records:
-            key_tuple = tuple(str(record[col]) for col in key_columns)
-            existing_keys.add(key_tuple)
-        
-        keys_to_delete = existing_keys - current_keys
-        
-        if not keys_to_delete:
-            print(f"✅ 삭제할 orphan 레코드 없음")
-            return
-        
-        print(f"🗑️  {len(keys_to_delete)}개의 orphan 레코드 발견, 삭제 중...")
-        
-        # 3. 삭제 실행
-        deleted_count = 0
-        for key_tuple in keys_to_delete:
-            # 복합키 조건 생성
-            conditions = []
-            for i, col in enumerate(key_columns):
-                conditions.append(f"{col}=eq.{key_tuple[i]}")
+        if engine == "async":
+            orphan_count, deleted_count = asyncio.run(_prune_async(
+                table_name, key_columns, chunk_size, concurrency or ASYNC_UPLOAD_CONCURRENCY,
+                current_keys=current_keys))
+        else:
+            pending = []
             
-            delete_url = f"{url}?{'&'.join(conditions)}"
-            del_response = requests.delete(delete_url, headers=headers)
+            # 1. Supabase 키를 페이지 단위로 스캔하며 소스에 없는 키 수집
+            for page in iter_existing_key_pages(table_name, key_columns):
+                for key_tuple in current_keys.missing(page):
+                    pending.append(key_tuple)
+                    orphan_count += 1
+                    
+                    # 2. chunk가 차면 바로 삭제 (keyset 스캔은 이미 지나간 키 삭제에 영향받지 않음)
+                    if len(pending) >= chunk_size:
+                        deleted_count += _delete_key_chunks(table_name, key_columns, pending, chunk_size)
+                        pending = []
             
-            if 200 <= del_response.status_code < 300:
-                deleted_count += 1
-            else:
-                print(f"⚠️ 삭제 실패 {key_tuple}: {del_response.text}")
+            if pending:
+                deleted_count += _delete_key_chunks(table_name, key_columns, pending, chunk_size)
         
-        print(f"✅ {deleted_count}개 레코드 삭제 완료")
+        if not orphan_count:
+            log(f"✅ 삭제할 orphan 레코드 없음")
+            return True
+        
+        log(f"🗑️  {orphan_count}개의 orphan 레코드 발견")
+        log(f"✅ {deleted_count}개 레코드 삭제 완료")
+        return deleted_count == orphan_count
         
     except Exception as e:
-        print(f"❌ Orphan 삭제 중 오류: {e}")
+        log(f"❌ Orphan 삭제 중 오류: {e}")
+        return False
+    finally:
+        metrics.add_time("prune", perf_counter() - started)
+        metrics.incr("orphans_found", orphan_count)
+        metrics.incr("orphans_deleted", deleted_count)
 
-def upload_csv_to_supabase(table_name, filepath, config):
-    """CSV 파일을 읽어 Supabase REST API를 통해 배치 Upsert 및 orphan 삭제"""
-    on_conflict_col = config.get("on_conflict")
-    print(f"\n--- [2단계] {table_name} 업로드 시작 (배치 크기: {BATCH_SIZE}) ---")
+def _clear_staged_keys(run_id):
+    """실패한 실행이 스테이징 테이블에 남긴 키 삭제 (실패해도 RPC가 하루 뒤 정리)"""
+    try:
+        get_supabase_session().delete(_table_url(PRUNE_STAGING_TABLE),
+                                      params={"run_id": f"eq.{run_id}"}, timeout=HTTP_TIMEOUT)
+    except requests.exceptions.RequestException:
+        pass
+
+def delete_orphans_rpc(table_name, key_columns, current_keys, batch_size=None):
+    """현재 키를 스테이징 테이블에 올린 뒤 RPC 한 번으로 서버에서 orphan 삭제
+
+    기존 키 스캔과 DELETE 왕복 대신 sync_prune_orphans 함수가 DELETE ... WHERE NOT EXISTS로
+    한 번에 지운다. 함수는 스테이징된 키 수가 보낸 키 수와 다르면 아무것도 지우지 않는다.
+    """
+    log(f"\n--- [3단계] {table_name}에서 orphan 레코드 삭제 시작 (서버 RPC) ---")
+    if DRY_RUN:
+        log(f"🧪 dry-run: {len(current_keys)}개 키 스테이징과 {PRUNE_RPC_FUNCTION} 호출 생략")
+        return True
+
+    session = get_supabase_session()
+    metrics = get_metrics(table_name)
+    run_id = str(uuid.uuid4())
+    started = perf_counter()
+    deleted_count = 0
+
+    try:
+        # 1. 현재 키를 run_id로 묶어 스테이징
+        for chunk in _iter_batches(current_keys, batch_size or PRUNE_STAGE_BATCH_SIZE):
+            body = encode_json([{"run_id": run_id, "table_name": table_name, "key": list(key)}
+                                for key in chunk])
+            response = session.post(_table_url(PRUNE_STAGING_TABLE), data=body,
+                                    headers={"Prefer": "return=minimal"}, timeout=HTTP_TIMEOUT)
+            metrics.incr("stage_requests")
+            if not 200 <= response.status_code < 300:
+                raise RuntimeError(f"키 스테이징 실패 (Code {response.status_code}): {response.text}")
+        log(f"📤 {len(current_keys)}개 키 스테이징 완료")
+
+        # 2. 서버에서 한 번에 삭제
+        rpc_started = perf_counter()
+        response = session.post(f"{SUPABASE_URL}/rest/v1/rpc/{PRUNE_RPC_FUNCTION}", timeout=HTTP_TIMEOUT,
+                                data=encode_json({"p_run_id": run_id, "p_table": table_name,
+                                                  "p_key_columns": list(key_columns),
+                                                  "p_expected_count": len(current_keys)}))
+        metrics.observe_latency("prune_rpc", perf_counter() - rpc_started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{PRUNE_RPC_FUNCTION} 실패 (Code {response.status_code}): {response.text}")
+        deleted_count = int(response.json())
+
+        log(f"✅ {deleted_count}개 orphan 레코드 삭제 완료" if deleted_count else "✅ 삭제할 orphan 레코드 없음")
+        return True
+
+    except Exception as e:
+        log(f"❌ Orphan 삭제 중 오류: {e}")
+        _clear_staged_keys(run_id)
+        return False
+    finally:
+        metrics.add_time("prune", perf_counter() - started)
+        metrics.incr("orphans_found", deleted_count)
+        metrics.incr("orphans_deleted", deleted_count)
+
+def _upload_batches(batches, send_batch, concurrency, position=None, on_committed=None):
+    """배치를 send_batch로 최대 concurrency개까지 동시에 전송하고 (성공 여부, 누적 행 수) 반환
+
+    전송 중인 배치가 concurrency개로 차면 가장 오래된 요청이 끝날 때까지 다음 배치를
+    읽지 않으므로(백프레셔) 메모리에 올라가는 배치 수가 제한된다. 결과는 제출 순서대로
+    확인해 진행 상황이 순서대로 출력되고, 첫 실패에서 나머지 대기 배치를 취소한다.
+    position()이 주어지면 배치를 만든 시점의 원본 행 위치를 기억해 두었다가, 그 배치와
+    앞선 배치가 모두 성공하면 on_committed(위치)를 호출한다 (체크포인트용).
+    """
+    total_count = 0
+    in_flight = deque()
+    executor = ThreadPoolExecutor(max_workers=concurrency, initializer=_set_log_prefix,
+                                  initargs=(getattr(_log_context, "prefix", ""),))
+
+    def complete_oldest():
+        nonlocal total_count
+        batch_len, batch_position, future = in_flight.popleft()
+        if not future.result():
+            return False
+        total_count += batch_len
+        log(f"✅ {batch_len}개 배치 성공. 누적: {total_count}")
+        if on_committed and batch_position is not None:
+            on_committed(batch_position)
+        return True
+
+    try:
+        for batch in batches:
+            if len(in_flight) >= concurrency and not complete_oldest():
+                return False, total_count
+            future = executor.submit(send_batch, batch)
+            in_flight.append((len(batch), position() if position else None, future))
+
+        while in_flight:
+            if not complete_oldest():
+                return False, total_count
+        return True, total_count
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _iter_batches(rows, batch_size):
+    """행 iterable을 batch_size 크기의 리스트로 묶어 반환
+
+    batch_size가 AdaptiveBatcher면 배치를 만들 때마다 현재 크기를 읽는다.
+    """
+    size_of = (lambda: batch_size.size) if isinstance(batch_size, AdaptiveBatcher) else (lambda: batch_size)
+    data_batch = []
+    for row in rows:
+        data_batch.append(row)
+        if len(data_batch) >= size_of():
+            yield data_batch
+            data_batch = []
+    if data_batch:
+        yield data_batch
+
+def delete_known_orphans(table_name, key_columns, orphan_keys, chunk_size=None,
+                         engine="thread", concurrency=None):
+    """이미 알고 있는 orphan 키 목록을 삭제 (스냅샷 기반, 키 스캔 없음)"""
+    log(f"\n--- [3단계] {table_name}에서 orphan 레코드 삭제 시작 (스냅샷 기준) ---")
     
-    if not os.path.exists(filepath):
-        print(f"❌ 파일 경로 오류: {filepath}를 찾을 수 없습니다.")
-        return
+    if not orphan_keys:
+        log(f"✅ 삭제할 orphan 레코드 없음")
+        return True
+    
+    metrics = get_metrics(table_name)
+    try:
+        log(f"🗑️  {len(orphan_keys)}개의 orphan 레코드 발견")
+        metrics.incr("orphans_found", len(orphan_keys))
+        with metrics.timer("prune"):
+            if engine == "async":
+                _, deleted_count = asyncio.run(_prune_async(
+                    table_name, key_columns, chunk_size or DELETE_CHUNK_SIZE,
+                    concurrency or ASYNC_UPLOAD_CONCURRENCY, orphan_keys=orphan_keys))
+            else:
+                deleted_count = _delete_key_chunks(table_name, key_columns, orphan_keys,
+                                                   chunk_size or DELETE_CHUNK_SIZE)
+        metrics.incr("orphans_deleted", deleted_count)
+        log(f"✅ {deleted_count}개 레코드 삭제 완료")
+        return deleted_count == len(orphan_keys)
+    except Exception as e:
+        log(f"❌ Orphan 삭제 중 오류: {e}")
+        return False
+
+# --- asyncio 업로드 엔진 (upload_engine: "async") ---
+class _HttpResult:
+    """aiohttp 응답에서 쓰는 값만 담은 객체 (requests.Response와 같은 속성 이름)"""
+
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+def _async_session(pool_size):
+    """aiohttp 세션 생성 (한 번의 업로드/삭제 실행 안에서 모든 요청이 커넥션 풀을 공유)"""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=pool_size),
+        headers=_auth_headers(),
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    )
+
+def _upload_engine(config):
+    """테이블 설정의 업로드 엔진 ("async"인데 aiohttp가 없으면 "thread"로 대체)"""
+    engine = config.get("upload_engine", DEFAULT_UPLOAD_ENGINE)
+    if engine == "async" and aiohttp is None:
+        log("⚠️ aiohttp가 설치되어 있지 않아 thread 엔진으로 업로드합니다.")
+        return "thread"
+    return engine
+
+async def _post_with_retry_async(session, table_name, body, headers, params):
+    """_post_with_retry의 asyncio 버전 (재시도 판단은 같은 _retry_delay 사용)"""
+    metrics = get_metrics(table_name)
+    connect_timeout = getattr(aiohttp, "ConnectionTimeoutError", ())
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        started = perf_counter()
+        metrics.incr("upsert_requests")
+        metrics.incr("bytes_sent", len(body))
+        try:
+            async with session.post(_table_url(table_name), headers=headers,
+                                    params=params, data=body) as response:
+                result = _HttpResult(response.status, await response.text(), response.headers)
+            metrics.observe_latency("upsert", perf_counter() - started)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            # 읽기 타임아웃은 배치가 너무 큰 신호, 연결 단계 오류/타임아웃은 재시도
+            if isinstance(e, asyncio.TimeoutError) and not isinstance(e, connect_timeout):
+                return None, perf_counter() - started
+            delay = _retry_delay(table_name, attempt, error=e)
+            if delay is None:
+                raise
+        else:
+            delay = _retry_delay(table_name, attempt, result)
+            if delay is None:
+                return result, perf_counter() - started
+        await asyncio.sleep(delay)
+
+async def _send_batch_async(session, data, table_name, on_conflict_col, gzip_level=0,
+                            batcher=None, rejected=None):
+    """_send_batch의 asyncio 버전 (응답 판정은 같은 _batch_result 사용)"""
+    params = {'on_conflict': on_conflict_col} if on_conflict_col else {}
+    body, raw_bytes, headers = _encode_batch(data, table_name, gzip_level)
+    if DRY_RUN:
+        return True
+
+    response, latency = await _post_with_retry_async(session, table_name, body, headers, params)
+    ok, split_reason = _batch_result(data, table_name, raw_bytes, response, latency, batcher, rejected)
+    if split_reason is None:
+        return ok
+    first, second = _split_batch(data, table_name, split_reason)
+    return (await _send_batch_async(session, first, table_name, on_conflict_col,
+                                    gzip_level, batcher, rejected)
+            and await _send_batch_async(session, second, table_name, on_conflict_col,
+                                        gzip_level, batcher, rejected))
+
+async def _upload_batches_async(batches, send_batch, concurrency, position=None, on_committed=None):
+    """_upload_batches의 asyncio 버전: (성공 여부, 누적 행 수) 반환
+
+    세마포어를 얻은 뒤에만 다음 배치를 읽으므로 전송 중인 배치는 최대 concurrency개다.
+    배치는 기본 스레드 풀에서 읽어(DB 커서 대기 등) 그동안에도 응답 처리가 계속된다.
+    배치 하나가 실패하거나 예외가 나면 더 읽지 않고 그 뒤에 제출된 전송을 즉시 취소하며,
+    앞선 배치는 끝까지 기다린다. 진행 로그와 on_committed는 앞선 배치가 모두 성공한
+    순서대로만 호출되므로 체크포인트가 앞서가지 않는다.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = deque()  # 제출 순서대로 (행 수, 원본 위치, task)
+    prefix = getattr(_log_context, "prefix", "")
+
+    def next_batch():
+        # 기본 스레드 풀 스레드에는 로그 접두어가 없으므로 _upload_batches처럼 넘겨준다
+        _set_log_prefix(prefix)
+        return next(batches, None)
+    failed = False
+    total_count = 0
+
+    def cancel_pending(after=None):
+        """after 다음에 제출된 task(없으면 전부) 취소"""
+        cancel = after is None
+        for _, _, task in pending:
+            if cancel:
+                task.cancel()
+            cancel = cancel or task is after
+
+    def commit_finished(_task=None):
+        nonlocal total_count
+        while pending and pending[0][2].done():
+            batch_len, batch_position, task = pending[0]
+            if task.cancelled() or task.exception() or not task.result():
+                return
+            pending.popleft()
+            total_count += batch_len
+            log(f"✅ {batch_len}개 배치 성공. 누적: {total_count}")
+            if on_committed and batch_position is not None:
+                on_committed(batch_position)
+
+    async def run(batch):
+        nonlocal failed
+        try:
+            ok = await send_batch(batch)
+        except Exception as e:
+            log(f"❌ 배치 전송 중 오류: {e}")
+            ok = False
+        finally:
+            semaphore.release()
+        if not ok and not failed:
+            failed = True
+            cancel_pending(after=asyncio.current_task())
+        return ok
+
+    try:
+        while not failed:
+            await semaphore.acquire()
+            batch = None if failed else await loop.run_in_executor(None, next_batch)
+            if batch is None:
+                semaphore.release()
+                break
+            task = asyncio.create_task(run(batch))
+            pending.append((len(batch), position() if position else None, task))
+            task.add_done_callback(commit_finished)
+        await asyncio.gather(*(task for _, _, task in pending), return_exceptions=True)
+        return not failed, total_count
+    finally:
+        cancel_pending()
+
+async def _upload_async(batches, send_batch, concurrency, position=None, on_committed=None):
+    """세션 하나를 열어 send_batch(session, batch)로 배치를 업로드"""
+    async with _async_session(concurrency) as session:
+        return await _upload_batches_async(batches, partial(send_batch, session), concurrency,
+                                           position, on_committed)
 
-    current_keys = set()  # 현재 소스 DB에 있는 키들
+async def _iter_existing_key_pages_async(session, table_name, key_columns, page_size=None):
+    """iter_existing_key_pages의 asyncio 버전 (요청 파라미터/응답 변환은 같은 헬퍼 사용)"""
+    url = _table_url(table_name)
+    metrics = get_metrics(table_name)
+    last_key = None
+
+    while True:
+        started = perf_counter()
+        async with session.get(url, params=_key_scan_params(key_columns, last_key, page_size)) as response:
+            status, text = response.status, await response.text()
+        metrics.observe_latency("key_scan", perf_counter() - started)
+        metrics.incr("key_scan_requests")
+        records = json.loads(text) if status == 200 else None
+        page, last_key = _key_scan_page(key_columns, status, text, records)
+        if page is None:
+            return
+        yield page
+
+async def _prune_async(table_name, key_columns, chunk_size, concurrency, current_keys=None, orphan_keys=None):
+    """orphan 삭제의 asyncio 버전: (찾은 orphan 수, 삭제된 수) 반환
+
+    orphan_keys가 주어지면 그 키를, 아니면 기존 키를 스캔하며 current_keys(KeyIndex)에 없는 키를 지운다.
+    chunk가 찰 때마다 DELETE를 띄우므로 키 스캔과 삭제가 겹치며, 진행 중인 DELETE는
+    최대 concurrency개다. 요청 예외가 나면 나머지 DELETE를 취소하고 예외를 올린다.
+    """
+    metrics = get_metrics(table_name)
+    url = _table_url(table_name)
+    running = set()
+    found = 0
+    deleted = 0
+
+    async def delete_chunk(chunk):
+        if DRY_RUN:
+            return len(chunk)
+        started = perf_counter()
+        async with session.delete(url, params=_orphan_filter(key_columns, chunk)) as response:
+            status, text = response.status, await response.text()
+        metrics.observe_latency("delete", perf_counter() - started)
+        metrics.incr("delete_requests")
+        deleted = _delete_result(table_name, chunk, status, text)
+        if deleted is not None:
+            return deleted
+        half = len(chunk) // 2
+        return await delete_chunk(chunk[:half]) + await delete_chunk(chunk[half:])
+
+    def collect(tasks):
+        nonlocal deleted
+        for task in tasks:
+            deleted += task.result()  # 예외가 있으면 여기서 올라감
+
+    async def submit(keys):
+        nonlocal running
+        for chunk in _fit_delete_url(key_columns, keys):
+            if len(running) >= concurrency:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+            running.add(asyncio.create_task(delete_chunk(chunk)))
+
+    async def candidates():
+        if orphan_keys is not None:
+            for key in orphan_keys:
+                yield key
+            return
+        async for page in _iter_existing_key_pages_async(session, table_name, key_columns):
+            for key in current_keys.missing(page):
+                yield key
+
+    async with _async_session(concurrency + 1) as session:  # +1: 삭제와 겹쳐 도는 키 스캔용
+        try:
+            pending = []
+            async for key in candidates():
+                pending.append(key)
+                found += 1
+                if len(pending) >= chunk_size:
+                    await submit(pending)
+                    pending = []
+            if pending:
+                await submit(pending)
+            if running:
+                done, running = await asyncio.wait(running)
+                collect(done)
+            return found, deleted
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+def _observe_rows(rows, on_row):
+    """행을 그대로 흘려보내면서 행마다 on_row 호출"""
+    for row in rows:
+        on_row(row)
+        yield row
+
+def upload_rows(table_name, rows, config, row_observer=None, serializer=None,
+                skip_rows=0, on_committed=None, send=True, on_rejected=None):
+    """행 iterable을 Supabase REST API로 배치 Upsert한 뒤 orphan 삭제 (성공 여부 반환)
+
+    row_observer가 주어지면 읽은 행마다 호출한다 (워터마크 추적 등).
+    on_rejected가 주어지면 데이터 오류로 거부된 행 목록으로 호출한다 (워터마크에서 제외).
+    serializer(RowSerializer)가 주어지면 전송 직전에 값을 JSON 타입으로 변환한다.
+    키/해시/워터마크는 변환 전 값으로 계산하므로 추출 방식과 무관하게 일정하다.
+    skip_rows는 이미 전송이 확인된 앞쪽 원본 행 수로, 키/스냅샷 계산에는 쓰되 전송하지 않는다.
+    on_committed(원본 행 위치)는 그 위치까지의 배치가 모두 성공할 때마다 호출된다.
+    change_detection 설정이 있으면 스냅샷과 해시가 같은 행은 전송하지 않고,
+    orphan도 스냅샷에서 바로 구한다. send=False면 업로드 단계를 건너뛰고 행에서 키만 모은다.
+    """
+    on_conflict_col = config.get("on_conflict")
+    engine = _upload_engine(config)
+    concurrency = config.get("upload_concurrency",
+                             ASYNC_UPLOAD_CONCURRENCY if engine == "async" else UPLOAD_CONCURRENCY)
+    key_columns = config.get("key_columns")
+    batcher = _make_batcher(config)
+    batch_size = config.get("batch_size", BATCH_SIZE)
+    if send:
+        log(f"\n--- [2단계] {table_name} 업로드 시작 (배치 크기: {batch_size}"
+            f"{' 부터 자동 조절' if batcher else ''}, 동시 요청: {concurrency}"
+            f"{', async' if engine == 'async' else ''}{', dry-run' if DRY_RUN else ''}) ---")
+
+    detector = None
+    if config.get("change_detection") and key_columns:
+        detector = ChangeDetector(table_name, key_columns, use_previous=not FULL_RESYNC)
+
+    current_keys = KeyIndex(key_columns) if key_columns else None  # 현재 소스 DB에 있는 키들
+    prune = config.get("delete_orphans") and key_columns
+    track_keys = prune and not (detector and detector.has_previous)
+    
+    def on_row(row):
+        if track_keys:
+            current_keys.add(row)
+        if row_observer:
+            row_observer(row)
+    
+    consumed = 0  # 지금까지 읽은 원본 행 수
+    
+    def count_row(row):
+        nonlocal consumed
+        consumed += 1
     
     try:
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            data_batch = []
-            total_count = 0
-            
-            for row in reader:
-                data_batch.append(row)
-                
-                # 키 추적
-                if config.get("delete_orphans") and config.get("key_columns"):
-                    key_tuple = tuple(str(row[col]) for col in config["key_columns"])
-                    current_keys.add(key_tuple)
-                
-                if len(data_batch) >= BATCH_SIZE:
-                    if _send_batch(data_batch, table_name, on_conflict_col):
-                        total_count += len(data_batch)
-                        print(f"✅ {len(data_batch)}개 배치 성공. 누적: {total_count}")
-                        data_batch = []
-                    else:
-                        print(f"❌ {table_name} 업로드 중단됨.")
-                        return
-
-            # 남은 데이터 처리
-            if data_batch:
-                if _send_batch(data_batch, table_name, on_conflict_col):
-                    total_count += len(data_batch)
-                    print(f"✅ 최종 남은 {len(data_batch)}개 배치 성공. 총 {total_count}개 처리.")
+        rows = _observe_rows(rows, count_row)
+        if track_keys or row_observer:
+            rows = _observe_rows(rows, on_row)
+        if detector:
+            rows = detector.filter(rows)
+        if skip_rows:
+            log(f"⏩ 체크포인트부터 재개: 앞의 {skip_rows}개 행은 전송하지 않음")
+            rows = (row for row in rows if consumed > skip_rows)
+        if serializer:
+            rows = serializer.serialize(rows)
+        if not send:
+            for _ in rows:
+                pass
+            log(f"⏭️  업로드 단계 생략: {consumed}개 행에서 키만 수집")
+        else:
+            batches = _iter_batches(rows, batcher or batch_size)
+            rejected = []  # 데이터 오류로 거부된 행
+            send_options = dict(table_name=table_name, on_conflict_col=on_conflict_col,
+                                gzip_level=config.get("gzip_level", GZIP_LEVEL), batcher=batcher,
+                                rejected=rejected)
+            metrics = get_metrics(table_name)
+            with metrics.timer("upload"):
+                if engine == "async":
+                    ok, total_count = asyncio.run(_upload_async(
+                        batches, partial(_send_batch_async, **send_options), concurrency,
+                        position=lambda: consumed, on_committed=on_committed))
                 else:
-                    print(f"❌ {table_name} 최종 업로드 중단됨.")
-                    return
+                    ok, total_count = _upload_batches(batches, partial(_send_batch, **send_options),
+                                                      concurrency, position=lambda: consumed,
+                                                      on_committed=on_committed)
+            metrics.incr("rows_uploaded", total_count - len(rejected))
+            metrics.incr("rows_rejected", len(rejected))
+            if detector:
+                metrics.incr("rows_unchanged", detector.skipped)
+            
+            if not ok:
+                log(f"❌ {table_name} 업로드 중단됨.")
+                return False
+            log(f"✅ {table_name} 업로드 완료. 총 {total_count}개 처리.")
+            if rejected:
+                log(f"⚠️ {len(rejected)}개 행이 거부되어 제외됨 (위 🚫 로그 참고)")
+                if detector:
+                    detector.mark_unsent(rejected)
+                if on_rejected:
+                    on_rejected(rejected)
+            raw_bytes = metrics.get("payload_bytes")
+            if raw_bytes:
+                sent_bytes = metrics.get("payload_bytes_compressed")
+                log(f"📦 전송량: {raw_bytes:,} → {sent_bytes:,} bytes "
+                    f"({metrics.get('batches_encoded')}개 배치, {1 - sent_bytes / raw_bytes:.0%} 절감)")
+            if detector and detector.has_previous:
+                log(f"⏭️  변경 없는 {detector.skipped}개 행 건너뜀")
         
         # Orphan 레코드 삭제
-        if config.get("delete_orphans") and config.get("key_columns"):
-            delete_orphaned_records(table_name, config["key_columns"], current_keys)
+        ok = True
+        if prune and detector and detector.has_previous:
+            ok = delete_known_orphans(table_name, key_columns, detector.orphan_keys(),
+                                      config.get("delete_chunk_size"), engine, concurrency)
+        elif prune and config.get("prune_mode", DEFAULT_PRUNE_MODE) == "rpc":
+            ok = delete_orphans_rpc(table_name, key_columns, current_keys)
+        elif prune:
+            ok = delete_orphaned_records(table_name, key_columns, current_keys,
+                                         config.get("delete_chunk_size"), engine, concurrency)
+        
+        # 스냅샷은 업로드와 삭제가 모두 성공했을 때만 갱신
+        if ok and detector:
+            detector.save()
+        return ok
 
     except Exception as e:
-        print(f"❌ {table_name} 업로드 중 알 수 없는 오류: {e}")
-    finally:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            print(f"✅ 임시 파일 삭제: {filepath}")
-
-def run_all_syncs():
-    """정의된 모든 쿼리를 순차적으로 실행"""
-    for table_name, config in QUERIES.items():
-        print(f"\n==================== {table_name.upper()} 동기화 시작 ====================")
-        temp_filename = f"{table_name}_export.csv"
+        log(f"❌ {table_name} 업로드 중 알 수 없는 오류: {e}")
+        return False
+
+def _file_fingerprint(filepath):
+    """체크포인트가 같은 추출 파일을 가리키는지 확인하기 위한 값 (크기 + 내용 해시)
+
+    캐시에서 복원한 파일은 수정 시각이 달라질 수 있으므로 내용으로 비교한다.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(partial(f.read, COPY_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return f"{os.path.getsize(filepath)}:{digest.hexdigest()}"
+
+def _extract_signature(query_config, watermark=None):
+    """추출 쿼리와 파라미터의 해시 (체크포인트의 파일이 이번 실행과 같은 조건으로 추출됐는지 확인용)"""
+    sql, params = _extract_query(query_config, watermark)
+    return hashlib.blake2b(json.dumps([sql, params], sort_keys=True, default=str).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+def load_checkpoint(table_name, filepath, extract_signature=None):
+    """filepath에 대한 유효한 체크포인트의 전송 완료 행 수 (없거나 파일이 바뀌었거나 오래됐으면 None)
+
+    extract_signature가 체크포인트와 다르면(예: 증분으로 추출한 파일인데 이번 실행은 전체
+    동기화) 부분 파일 기준으로 orphan을 지우지 않도록 재개하지 않는다.
+    """
+    checkpoint = load_state("checkpoints").get(table_name)
+    if not checkpoint or checkpoint.get("file") != filepath or not os.path.exists(filepath):
+        return None
+    if checkpoint.get("extract") != extract_signature:
+        log("⚠️ 체크포인트의 추출 조건(증분/전체, 워터마크)이 이번 실행과 달라 처음부터 다시 추출합니다.")
+        return None
+    created = checkpoint.get("created")
+    if not created or datetime.now() - datetime.fromisoformat(created) > timedelta(hours=CHECKPOINT_MAX_AGE_HOURS):
+        log(f"⚠️ 체크포인트가 {CHECKPOINT_MAX_AGE_HOURS}시간보다 오래되어 처음부터 다시 추출합니다.")
+        return None
+    if checkpoint.get("fingerprint") != _file_fingerprint(filepath):
+        return None
+    return checkpoint.get("offset", 0)
+
+def upload_csv_to_supabase(table_name, filepath, config, row_observer=None, skip_rows=0,
+                           send=True, keep_file=False, on_rejected=None, extract_signature=None):
+    """CSV 파일을 읽어 upload_rows로 업로드 (성공 여부 반환)
+
+    CHECKPOINTS가 켜져 있으면 순서대로 성공한 배치까지의 행 수를 추출 조건
+    (extract_signature)과 함께 상태 파일에 기록하고,
+    실패하면 --resume으로 이어서 올릴 수 있도록 임시 파일을 남겨 둔다.
+    성공하면 체크포인트와 임시 파일을 지운다. keep_file이면 (일부 단계만 실행할 때)
+    다음 단계에서 쓸 수 있도록 파일을 항상 남긴다.
+    """
+    if not os.path.exists(filepath):
+        log(f"❌ 파일 경로 오류: {filepath}를 찾을 수 없습니다.")
+        return False
+
+    columns_path = _columns_path(filepath)
+    serializer = None
+    if os.path.exists(columns_path):
+        with open(columns_path, encoding='utf-8') as f:
+            serializer = RowSerializer("text", json.load(f))
+
+    on_committed = None
+    if CHECKPOINTS and send:
+        fingerprint = _file_fingerprint(filepath)
+        # 재개한 경우 원래 추출 시각을 유지해야 나이 제한이 추출 시점 기준으로 적용됨
+        previous = load_state("checkpoints").get(table_name) if skip_rows else None
+        created = (previous or {}).get("created") or datetime.now().isoformat(timespec="seconds")
         
-        # 1. 추출
-        filepath = extract_db_to_csv(config, temp_filename)
+        def on_committed(offset):
+            update_state("checkpoints", table_name,
+                         {"file": filepath, "fingerprint": fingerprint, "offset": offset,
+                          "created": created, "extract": extract_signature})
+        
+        # 첫 배치 전에 실패해도 추출 파일은 재사용할 수 있도록 바로 기록
+        on_committed(skip_rows)
+
+    ok = False
+    try:
+        with open(filepath, mode='r', encoding='utf-8') as f:
+            ok = upload_rows(table_name, csv.DictReader(f), config, row_observer, serializer,
+                             skip_rows, on_committed, send, on_rejected)
+        return ok
+    finally:
+        if ok and send:
+            update_state("checkpoints", table_name, None)
+        if keep_file:
+            log(f"💾 다음 단계를 위해 추출 파일 보존: {filepath}")
+        elif ok or not CHECKPOINTS:
+            update_state("checkpoints", table_name, None)
+            if os.path.exists(columns_path):
+                os.remove(columns_path)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                log(f"✅ 임시 파일 삭제: {filepath}")
+        else:
+            log(f"💾 재개용으로 임시 파일 보존: {filepath} (--resume으로 이어서 업로드)")
+
+def sync_table(table_name, config, resume=False, phases=ALL_PHASES):
+    """테이블 하나를 추출 → 업로드 → orphan 삭제 순으로 동기화하고 성공 여부 반환
+
+    incremental 설정이 있는 테이블은 저장된 워터마크 이후 행만 추출/업로드하고,
+    부분 데이터로는 orphan을 판단할 수 없으므로 삭제 단계를 건너뛴다. 워터마크가 없거나
+    FULL_RESYNC=1이거나 마지막 전체 동기화 후 full_resync_days가 지났으면 전체를 동기화해
+    (취소/환불되거나 기간을 벗어난 행 삭제) 그 시각을 기록하며, 성공한 경우에만 새 워터마크를 저장한다.
+    resume이면 이전 실행이 남긴 추출 파일과 체크포인트가 있을 때 추출을 건너뛰고
+    확인된 행 다음부터 업로드한다 (csv 파이프라인만 해당).
+    phases로 extract / upload / prune 중 일부만 실행할 수 있으며, 이때는 단계 사이에
+    TEMP_DIR의 추출 파일을 주고받는다 (stream 파이프라인도 파일 경유로 바뀜).
+    """
+    log(f"\n==================== {table_name.upper()} 동기화 시작 ====================")
+    temp_filename = f"{table_name}_export.csv"
+    
+    incremental = config.get("incremental")
+    watermark = None
+    tracker = None
+    run_config = config
+    if incremental:
+        tracker = WatermarkTracker(incremental["column"])
+        if not FULL_RESYNC:
+            watermark = load_state("watermarks").get(table_name)
+        full_resync_days = incremental.get("full_resync_days")
+        last_full_sync = load_state("full_syncs").get(table_name)
+        if watermark and full_resync_days and (
+                not last_full_sync
+                or datetime.now() - datetime.fromisoformat(last_full_sync) >= timedelta(days=full_resync_days)):
+            log(f"🗓️ 마지막 전체 동기화({last_full_sync or '기록 없음'}) 후 {full_resync_days}일이 지나 "
+                f"orphan 정리를 위해 전체 동기화합니다.")
+            watermark = None
+        if watermark:
+            log(f"⏩ 증분 동기화: {incremental['column']} > {watermark} (- {incremental.get('lookback', '0')})")
+            # 부분 데이터이므로 orphan 삭제와 스냅샷 비교 모두 하지 않음
+            run_config = dict(config, delete_orphans=False, change_detection=False)
+        else:
+            log(f"🔄 전체 동기화 (저장된 워터마크 없음 또는 FULL_RESYNC)")
+    
+    do_extract, do_upload, do_prune = (phase in phases for phase in ALL_PHASES)
+    partial_run = not (do_extract and do_upload and do_prune)
+    if not do_prune:
+        run_config = dict(run_config, delete_orphans=False)
+    if not (do_upload and do_prune):
+        # 스냅샷은 업로드와 orphan 삭제를 함께 해야 일관되게 갱신할 수 있음
+        run_config = dict(run_config, change_detection=False)
+    if not do_upload:
+        tracker = None
+    
+    if do_upload and not config.get("on_conflict"):
+        log(f"⚠️ {table_name} 테이블의 'on_conflict' 키가 정의되지 않아 **Insert만** 시도합니다.")
+    
+    row_observer = tracker.observe if tracker else None
+    on_rejected = tracker.exclude if tracker else None
+    filepath = os.path.join(TEMP_DIR, temp_filename)
+    pipeline = config.get("pipeline", DEFAULT_PIPELINE)
+    if resume and pipeline == "stream":
+        log(f"⚠️ stream 파이프라인은 재개할 추출 파일이 없어 처음부터 동기화합니다.")
+    
+    loader = _loader(config) if do_extract and do_upload else "rest"
+    if loader == "swap" and (watermark or not do_prune):
+        # 부분 데이터로 테이블을 교체하면 나머지 행이 사라지므로 upsert로 적재
+        log("ℹ️ 증분 동기화 또는 prune 단계 제외 실행이라 교체 대신 direct로 적재합니다.")
+        loader = "direct"
+    extract_signature = _extract_signature(config, watermark)
+    checkpoint = None
+    if resume and pipeline != "stream" and do_upload and loader == "rest":
+        checkpoint = load_checkpoint(table_name, filepath, extract_signature)
+    
+    if loader in ("direct", "swap"):
+        # 1+2+3. 대상 Postgres에 한 트랜잭션으로 적재 (파일/REST 요청 없음)
+        watermark_column = tracker.column if tracker else None
+        if loader == "swap":
+            ok, max_value = load_swap(table_name, run_config, watermark_column)
+        else:
+            ok, max_value = load_direct(table_name, run_config, watermark,
+                                        prune=bool(run_config.get("delete_orphans")),
+                                        watermark_column=watermark_column)
+        if ok and max_value:
+            tracker.observe({tracker.column: max_value})
+        if ok and config.get("change_detection") and not DRY_RUN:
+            # REST 경로의 스냅샷은 더 이상 대상과 맞지 않으므로 비워 다음 REST 실행을 전체 동기화로
+            save_state(f"snapshot_{table_name}", {})
+    elif checkpoint is not None:
+        # 1. 추출 생략: 이전 실행의 파일을 그대로 사용
+        log(f"\n--- [1단계] 이전 추출 파일 재사용: {filepath} ({checkpoint}개 행 전송 확인됨) ---")
+        ok = upload_csv_to_supabase(table_name, filepath, run_config, row_observer, checkpoint,
+                                    keep_file=partial_run, on_rejected=on_rejected,
+                                    extract_signature=extract_signature)
+    elif pipeline == "stream" and do_extract and do_upload:
+        # 1+2. 추출하면서 바로 업로드 및 삭제
+        log(f"\n--- [1단계] {table_name} 스트리밍 추출 시작 (업로드와 동시 진행) ---")
+        debug_csv_path = filepath if KEEP_DEBUG_CSV else None
+        serializer = RowSerializer("native")
+        rows = iter_db_rows(table_name, config, watermark, debug_csv_path, serializer)
+        ok = upload_rows(table_name, rows, run_config, row_observer, serializer, on_rejected=on_rejected)
+    else:
+        # 1. 추출 (extract 단계를 빼면 이전에 추출해 둔 파일 사용)
+        if do_extract:
+            filepath = extract_db_to_csv(config, temp_filename, watermark, table_name=table_name)
+            if not filepath:
+                return False
         
         # 2. 업로드 및 삭제
-        if filepath:
-            if not config.get("on_conflict"):
-                print(f"⚠️ {table_name} 테이블의 'on_conflict' 키가 정의되지 않아 **Insert만** 시도합니다.")
-            
-            upload_csv_to_supabase(table_name, filepath, config)
+        if do_upload or do_prune:
+            ok = upload_csv_to_supabase(table_name, filepath, run_config, row_observer,
+                                        send=do_upload, keep_file=partial_run, on_rejected=on_rejected,
+                                        extract_signature=extract_signature)
+        else:
+            log(f"💾 추출만 실행: {filepath} 보존")
+            ok = True
+    
+    # 3. 워터마크 갱신 (새 행이 없으면 기존 값 유지, 거부된 행은 다음 실행에서 다시 읽도록 넘지 않음)
+    if ok and tracker and tracker.value:
+        new_watermark = max(tracker.watermark(), watermark or "")
+        update_state("watermarks", table_name, new_watermark)
+        log(f"💾 워터마크 저장: {new_watermark}")
+    if ok and incremental and not watermark and run_config.get("delete_orphans"):
+        update_state("full_syncs", table_name, datetime.now().isoformat(timespec="seconds"))
+    return ok
+
+def _sync_table_worker(table_name, config, parallel, resume, phases):
+    """병렬 실행용 래퍼: 로그 접두어를 붙이고 예외를 실패로 기록"""
+    _set_log_prefix(f"[{table_name}] " if parallel else "")
+    try:
+        with get_metrics(table_name).timer("total"):
+            return sync_table(table_name, config, resume, phases)
+    except Exception as e:
+        log(f"❌ {table_name} 동기화 중 오류: {e}")
+        return False
+    finally:
+        _set_log_prefix("")
+
+def run_all_syncs(workers=None, resume=False, tables=None, phases=ALL_PHASES, overrides=None):
+    """정의된 쿼리(tables로 일부만 선택 가능)를 실행하고 테이블별 성공 여부 dict 반환
+
+    테이블끼리는 서로 독립적이므로 workers개(기본 SYNC_WORKERS)까지 동시에 실행해
+    한 테이블의 DB 추출과 다른 테이블의 업로드가 겹치게 한다. 병렬 실행 중에는
+    로그 줄마다 [테이블] 접두어가 붙는다. overrides는 모든 테이블 설정에 덮어쓸 값이다.
+    """
+    queries = {
+        table_name: dict(config, **(overrides or {}))
+        for table_name, config in QUERIES.items()
+        if not tables or table_name in tables
+    }
+    workers = max(1, min(workers or SYNC_WORKERS, len(queries)))
+    parallel = workers > 1
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            table_name: executor.submit(_sync_table_worker, table_name, config, parallel, resume, phases)
+            for table_name, config in queries.items()
+        }
+        results = {table_name: future.result() for table_name, future in futures.items()}
+    
+    log(f"\n==================== 동기화 결과 ====================")
+    for table_name, ok in results.items():
+        log(f"{'✅' if ok else '❌'} {table_name}: {'성공' if ok else '실패'}")
+        phases = get_metrics(table_name).to_dict()["phase_seconds"]
+        if phases:
+            log("   ⏱️  " + ", ".join(f"{phase} {sec:.1f}s" for phase, sec in phases.items()))
+    return results
+
+def write_run_report(path, results, started_at, wall_seconds):
+    """테이블별 성공 여부와 계측값을 JSON 리포트로 저장 (dry-run에서도 저장)"""
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": round(wall_seconds, 3),
+        "dry_run": DRY_RUN,
+        "tables": {
+            table_name: dict(ok=ok, **get_metrics(table_name).to_dict())
+            for table_name, ok in results.items()
+        }
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    log(f"📊 실행 리포트 저장: {path}")
+
+def main(argv=None):
+    global DRY_RUN, FULL_RESYNC
+
+    parser = argparse.ArgumentParser(description="외부 PostgreSQL → Supabase 동기화")
+    parser.add_argument("--tables", nargs="+", choices=list(QUERIES), metavar="TABLE",
+                        help=f"동기화할 테이블 (기본: 전체 {', '.join(QUERIES)})")
+    parser.add_argument("--phase", nargs="+", choices=ALL_PHASES, default=list(ALL_PHASES),
+                        dest="phases", help="실행할 단계 (기본: extract upload prune)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="추출/조회/인코딩은 하되 Supabase 쓰기와 상태 파일 저장은 하지 않음")
+    parser.add_argument("--batch-size", type=int, help="배치 행 수 (적응형 배치의 시작 크기)")
+    parser.add_argument("--concurrency", type=int, help="테이블당 동시 업로드 요청 수")
+    parser.add_argument("--workers", type=int, help="동시에 동기화할 테이블 수")
+    parser.add_argument("--engine", choices=["thread", "async"],
+                        help="업로드/삭제 엔진 (기본: 테이블 설정 또는 SYNC_UPLOAD_ENGINE)")
+    parser.add_argument("--loader", choices=["rest", "direct", "swap"],
+                        help="적재 방식 (기본: 테이블 설정, direct/swap은 SUPABASE_DB_URL 필요)")
+    parser.add_argument("--prune-mode", choices=["scan", "rpc"],
+                        help="orphan 삭제 방식 (기본: 테이블 설정 또는 SYNC_PRUNE_MODE)")
+    parser.add_argument("--full-resync", action="store_true",
+                        help="워터마크/스냅샷을 무시하고 전체 재동기화 (FULL_RESYNC=1과 같음)")
+    parser.add_argument("--resume", action="store_true",
+                        help="이전 실행이 남긴 추출 파일과 체크포인트가 있으면 이어서 업로드")
+    parser.add_argument("--report", default=REPORT_PATH,
+                        help="단계별 시간/처리량 JSON 리포트 경로 (기본: SYNC_REPORT_PATH 또는 sync_report.json)")
+    args = parser.parse_args(argv)
+
+    DRY_RUN = args.dry_run
+    FULL_RESYNC = FULL_RESYNC or args.full_resync
+    overrides = {}
+    if args.batch_size:
+        overrides["batch_size"] = args.batch_size
+    if args.concurrency:
+        overrides["upload_concurrency"] = args.concurrency
+    if args.engine:
+        overrides["upload_engine"] = args.engine
+    if args.prune_mode:
+        overrides["prune_mode"] = args.prune_mode
+    if args.loader:
+        overrides["loader"] = args.loader
+
+    required = {}
+    if "extract" in args.phases:
+        required["DB_PASSWORD"] = DB_PASSWORD
+    if "upload" in args.phases or "prune" in args.phases:
+        required.update(SUPABASE_URL=SUPABASE_URL, SUPABASE_KEY=SUPABASE_KEY)
+    missing = [name for name, value in required.items() if not value]
+    if missing:
+        print(f"❌ 환경 변수 ({', '.join(missing)})를 설정해야 합니다.")
+        return 1
+
+    if DRY_RUN:
+        log("🧪 dry-run: Supabase에 쓰지 않고 상태 파일도 저장하지 않습니다.")
+    started_at = datetime.now()
+    started = perf_counter()
+    results = run_all_syncs(workers=args.workers, resume=args.resume, tables=args.tables,
+                            phases=tuple(args.phases), overrides=overrides)
+    if args.report:
+        write_run_report(args.report, results, started_at, perf_counter() - started)
+    return 0 if all(results.values()) else 1
 
 if __name__ == "__main__":
-    if not (SUPABASE_URL and SUPABASE_KEY and DB_PASSWORD):
-        print("❌ 환경 변수 (SUPABASE_URL, SUPABASE_KEY, DB_PASSWORD)를 설정해야 합니다.")
-    else:
-        run_all_syncs()
+    sys.exit(main())
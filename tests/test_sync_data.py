@@ -0,0 +1,285 @@
+"""sync_data 테스트 (소스 DB 없이, 업로드/삭제는 벤치마크용 PostgREST 스텁 서버로 실행)"""
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import sync_data  # noqa: E402
+from mock_postgrest import MockPostgREST  # noqa: E402
+from sync_data import KeyIndex, _keyset_filter, _orphan_filter, _split_range  # noqa: E402
+
+
+def _index(key_columns, rows):
+    index = KeyIndex(key_columns)
+    for row in rows:
+        index.add(dict(zip(key_columns, row)))
+    return index
+
+
+# --- KeyIndex ---
+def test_key_index_single_int_keys():
+    index = _index(["id"], [(3,), ("1",), (2,), (3,)])
+    assert index.missing([("1",), ("2",), ("3",), ("4",), ("0",)]) == [("4",), ("0",)]
+    assert ("2",) in index
+    assert ("5",) not in index
+
+
+def test_key_index_composite_int_keys():
+    index = _index(["user_id", "order_id"], [(1, 10), (1, 11), (2, 10)])
+    page = [("1", "10"), ("1", "12"), ("2", "10"), ("2", "11"), ("3", "10")]
+    assert index.missing(page) == [("1", "12"), ("2", "11"), ("3", "10")]
+
+
+def test_key_index_composite_out_of_range_value_is_missing():
+    # 인덱스의 최댓값보다 비트가 많은 값은 packing 범위 밖이므로 없는 키로 판정
+    index = _index(["user_id", "order_id"], [(1, 3), (2, 1)])
+    assert index.missing([("1", "3"), ("1", "1024"), ("1024", "1")]) == [("1", "1024"), ("1024", "1")]
+
+
+def test_key_index_rejects_non_canonical_page_keys():
+    # 정수 모드라도 "007"은 str 기준으로 "7"과 다른 키
+    index = _index(["id"], [(7,), (8,)])
+    page = [("7",), ("007",), ("+7",), (" 8",), ("-0",), ("8",)]
+    assert index.missing(page) == [("007",), ("+7",), (" 8",), ("-0",)]
+
+
+def test_key_index_non_canonical_source_key_falls_back_to_set():
+    index = _index(["id"], [("007",), (8,)])
+    assert index.missing([("7",), ("007",), ("8",)]) == [("7",)]
+
+
+def test_key_index_mixed_page_checks_each_key():
+    index = _index(["id"], [(1,), (2,)])
+    assert index.missing([("1",), ("abc",), ("2",), ("1.0",)]) == [("abc",), ("1.0",)]
+
+
+def test_key_index_non_int_keys_use_set():
+    index = _index(["code"], [("A-1",), ("B-2",)])
+    assert index.missing([("A-1",), ("C-3",)]) == [("C-3",)]
+
+
+def test_key_index_wide_composite_falls_back_to_set():
+    # 묶은 비트가 63을 넘으면 set 모드
+    index = _index(["a", "b"], [(2 ** 40, 2 ** 40), (1, 1)])
+    assert index.missing([(str(2 ** 40), str(2 ** 40)), ("1", "2")]) == [("1", "2")]
+
+
+def test_key_index_add_after_lookup():
+    index = _index(["id"], [(1,)])
+    assert index.missing([("2",)]) == [("2",)]
+    index.add({"id": 2})
+    assert index.missing([("1",), ("2",), ("3",)]) == [("3",)]
+
+
+def test_key_index_empty():
+    index = KeyIndex(["id"])
+    assert index.missing([("1",)]) == [("1",)]
+    assert index.missing([]) == []
+
+
+def test_key_index_matches_str_set():
+    rows = [(u, o) for u in range(0, 200, 3) for o in range(0, 50, 7)]
+    index = _index(["user_id", "order_id"], rows)
+    expected = {(str(u), str(o)) for u, o in rows}
+    page = [(str(u), str(o)) for u in range(0, 210, 2) for o in range(0, 55, 5)]
+    page += [("03", "0"), ("3", "00"), ("x", "1")]
+    assert index.missing(page) == [key for key in page if key not in expected]
+
+
+def test_key_index_without_numpy(monkeypatch):
+    monkeypatch.setattr(sync_data, "np", None)
+    index = _index(["id"], [(7,), ("8",)])
+    assert index.missing([("7",), ("007",), ("9",)]) == [("007",), ("9",)]
+
+
+# --- PostgREST 필터 ---
+def test_orphan_filter_single_key():
+    assert _orphan_filter(["id"], [("1",), ("2",)]) == {"id": "in.(1,2)"}
+
+
+def test_orphan_filter_composite_groups_by_prefix():
+    keys = [("1", "10"), ("1", "11"), ("2", "10")]
+    assert _orphan_filter(["user_id", "order_id"], keys) == {
+        "or": "(and(user_id.eq.1,order_id.in.(10,11)),and(user_id.eq.2,order_id.in.(10)))"
+    }
+
+
+def test_orphan_filter_quotes_reserved_characters():
+    keys = [("a,b",), ('say "hi"',), ("plain",)]
+    assert _orphan_filter(["code"], keys) == {"code": 'in.("a,b","say \\"hi\\"",plain)'}
+
+
+def test_keyset_filter_single_key():
+    assert _keyset_filter(["id"], (5,)) == {"id": "gt.5"}
+
+
+def test_keyset_filter_composite():
+    assert _keyset_filter(["user_id", "order_id"], (1, 10)) == {
+        "or": "(user_id.gt.1,and(user_id.eq.1,order_id.gt.10))"
+    }
+    assert _keyset_filter(["a", "b", "c"], ("x", "y.z", 3)) == {
+        "or": '(a.gt.x,and(a.eq.x,b.gt."y.z"),and(a.eq.x,b.eq."y.z",c.gt.3))'
+    }
+
+
+# --- 구간 분할 ---
+def test_split_range_int():
+    assert _split_range(0, 100, 4) == [25, 50, 75]
+
+
+def test_split_range_small_int_range_drops_duplicates():
+    assert _split_range(0, 2, 4) == [1]
+
+
+def test_split_range_date_and_datetime():
+    assert _split_range(date(2026, 1, 1), date(2026, 1, 5), 2) == [date(2026, 1, 3)]
+    assert _split_range(datetime(2026, 1, 1), datetime(2026, 1, 2), 4) == [
+        datetime(2026, 1, 1, 6), datetime(2026, 1, 1, 12), datetime(2026, 1, 1, 18)
+    ]
+
+
+def test_split_range_float():
+    assert _split_range(0.0, 1.0, 4) == pytest.approx([0.25, 0.5, 0.75])
+
+
+@pytest.mark.parametrize("low, high, count", [
+    (None, 10, 4), (0, None, 4), (5, 5, 4), (10, 0, 4), (0, 10, 1),
+])
+def test_split_range_no_bounds(low, high, count):
+    assert _split_range(low, high, count) == []
+
+
+# --- 값 변환 ---
+def test_decimal_to_json_keeps_precision():
+    assert sync_data._decimal_to_json(Decimal("12345678901234567.123456789")) == "12345678901234567.123456789"
+    assert sync_data._decimal_to_json(Decimal("2.00")) == 2
+    assert sync_data._decimal_to_json(Decimal("NaN")) == "NaN"
+    assert sync_data._decimal_to_json(Decimal("Infinity")) == "Infinity"
+    assert sync_data._decimal_to_json(None) is None
+
+
+def test_parse_numeric_text_keeps_precision():
+    assert sync_data._parse_numeric_text("42") == 42
+    assert sync_data._parse_numeric_text("0.1000000000000000055511") == "0.1000000000000000055511"
+    assert sync_data._parse_numeric_text("1E+2") == "1E+2"
+
+
+@pytest.mark.parametrize("kind, value", [
+    ("json", {"a": 1, "b": ["x", None], "c": "한글"}),
+    ("json", [1, "x"]),
+    ("json", "text"),
+    ("numeric_array", [Decimal("1.5"), None, Decimal("2")]),
+])
+def test_cursor_csv_values_round_trip(kind, value):
+    # csv.writer 경로(stream/buffered 추출)로 기록한 값이 업로드 시 다시 같은 JSON 값이 되어야 함
+    text = sync_data.CURSOR_CSV_CONVERTERS[kind](value)
+    parsed = sync_data.TEXT_CONVERTERS[kind](text)
+    expected = [sync_data._decimal_to_json(v) for v in value] if kind == "numeric_array" else value
+    assert parsed == expected
+
+
+# --- 체크포인트 재개 ---
+RESUME_CONFIG = {
+    "sql": "SELECT id, updated_at FROM orders",
+    "on_conflict": "id",
+    "key_columns": ["id"],
+    "delete_orphans": True,
+    "pipeline": "csv",
+    "loader": "rest",
+    "change_detection": False,
+    "incremental": {"column": "updated_at", "full_resync_days": 7},
+}
+
+
+def _write_export(path, ids):
+    """extract_db_to_csv처럼 CSV와 컬럼 타입 파일(int8, timestamp)을 기록"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "updated_at"])
+        writer.writerows((i, "2026-10-01 00:00:00") for i in ids)
+    with open(sync_data._columns_path(path), "w", encoding="utf-8") as f:
+        json.dump([["id", 20], ["updated_at", 1114]], f)
+
+
+@pytest.fixture
+def sync_env(tmp_path, monkeypatch):
+    """상태/추출 파일을 tmp_path에 두고 스텁 PostgREST로 업로드하는 환경"""
+    monkeypatch.setattr(sync_data, "STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(sync_data, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(sync_data, "SUPABASE_DB_URL", None)
+    monkeypatch.setattr(sync_data, "FULL_RESYNC", False)
+    monkeypatch.setattr(sync_data, "DRY_RUN", False)
+    with MockPostgREST() as mock:
+        monkeypatch.setattr(sync_data, "SUPABASE_URL", mock.url)
+        monkeypatch.setattr(sync_data, "_session", None)
+        yield mock
+
+
+def _seed(mock, ids):
+    response = sync_data.get_supabase_session().post(
+        sync_data._table_url("orders"), params={"on_conflict": "id"},
+        json=[{"id": i, "updated_at": "2026-10-01 00:00:00"} for i in ids])
+    assert response.status_code < 300
+    assert mock.row_counts() == {"orders": len(ids)}
+
+
+def _leave_failed_incremental_export(watermark, ids):
+    """증분 추출 후 업로드가 실패한 이전 실행의 추출 파일과 체크포인트를 남김"""
+    path = os.path.join(sync_data.TEMP_DIR, "orders_export.csv")
+    _write_export(path, ids)
+    sync_data.update_state("checkpoints", "orders", {
+        "file": path,
+        "fingerprint": sync_data._file_fingerprint(path),
+        "offset": 0,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "extract": sync_data._extract_signature(RESUME_CONFIG, watermark),
+    })
+    return path
+
+
+def test_resume_refuses_incremental_export_for_full_sync(sync_env, monkeypatch):
+    _seed(sync_env, range(1, 1001))
+    watermark = "2026-10-10 00:00:00"
+    sync_data.update_state("watermarks", "orders", watermark)
+    # 재실행 시점에는 full_resync_days가 지나 전체 동기화(+ orphan 삭제)로 결정됨
+    last_full = (datetime.now() - timedelta(days=8)).isoformat(timespec="seconds")
+    sync_data.update_state("full_syncs", "orders", last_full)
+    _leave_failed_incremental_export(watermark, range(991, 1001))
+
+    extracted = []
+
+    def extract(query_config, temp_filename, watermark=None, table_name=None):
+        extracted.append(watermark)
+        path = os.path.join(sync_data.TEMP_DIR, temp_filename)
+        _write_export(path, range(1, 1001))
+        return path
+
+    monkeypatch.setattr(sync_data, "extract_db_to_csv", extract)
+    assert sync_data.sync_table("orders", RESUME_CONFIG, resume=True)
+    assert extracted == [None]
+    assert sync_env.row_counts() == {"orders": 1000}
+    assert sync_data.load_state("checkpoints") == {}
+
+
+def test_resume_continues_matching_incremental_export(sync_env, monkeypatch):
+    _seed(sync_env, range(1, 11))
+    watermark = "2026-10-10 00:00:00"
+    sync_data.update_state("watermarks", "orders", watermark)
+    sync_data.update_state("full_syncs", "orders", datetime.now().isoformat(timespec="seconds"))
+    path = _leave_failed_incremental_export(watermark, range(11, 21))
+
+    def extract(*args, **kwargs):
+        raise AssertionError("같은 조건의 추출 파일이 있으면 다시 추출하지 않아야 함")
+
+    monkeypatch.setattr(sync_data, "extract_db_to_csv", extract)
+    assert sync_data.sync_table("orders", RESUME_CONFIG, resume=True)
+    assert sync_env.row_counts() == {"orders": 20}
+    assert not os.path.exists(path)